@@ -1,28 +1,27 @@
-import io
+import asyncio
 import mimetypes
-from typing import Optional
+from typing import List, Optional, Tuple
+from config import REPORT_SECTION_TOKENS, REPORT_MAP_CONCURRENCY, REPORT_MAX_TEXT_CHARS
 from Agents.llms_manager_agent import LLMManager
+from Agents.upload_handler import BufferReader
+from Agents.report_result_cache import report_result_cache
+from Agents.instrumentation import timed
 
 # --- Text Extraction Libraries ---
-# Image OCR
-try:
+# Image OCR (preprocessing + parallel Tesseract, see ocr_pipeline)
+from Agents.ocr_pipeline import ocr_image_bytes, PYTESSERACT_AVAILABLE
+if PYTESSERACT_AVAILABLE:
     import pytesseract
-    from PIL import Image
-    PYTESSERACT_AVAILABLE = True
-except ImportError:
-    PYTESSERACT_AVAILABLE = False
+else:
     print("⚠️ Warning: pytesseract or Pillow not found. OCR for images will not be available.")
     print("   Install them: pip install pytesseract Pillow")
     print("   AND ensure Tesseract OCR engine is installed on your system.")
 
-# PDF Reading
-try:
-    import PyPDF2
-    PYPDF2_AVAILABLE = True
-except ImportError:
-    PYPDF2_AVAILABLE = False
-    print("⚠️ Warning: PyPDF2 not found. PDF text extraction will not be available.")
-    print("   Install it: pip install PyPDF2")
+# PDF Reading (PyMuPDF, with PyPDF2 as fallback)
+from Agents.pdf_text_extractor import extract_pdf_text, PYMUPDF_AVAILABLE, PYPDF2_AVAILABLE
+if not (PYMUPDF_AVAILABLE or PYPDF2_AVAILABLE):
+    print("⚠️ Warning: neither PyMuPDF nor PyPDF2 found. PDF text extraction will not be available.")
+    print("   Install it: pip install PyMuPDF")
 
 # Word Document Reading (.docx)
 try:
@@ -37,7 +36,7 @@ except ImportError:
 # --- Constants ---
 # Define supported MIME types based on available libraries
 SUPPORTED_MIME_TYPES = {
-    "application/pdf": PYPDF2_AVAILABLE,
+    "application/pdf": PYMUPDF_AVAILABLE or PYPDF2_AVAILABLE,
     "application/vnd.openxmlformats-officedocument.wordprocessingml.document": DOCX_AVAILABLE, # .docx
     # Add common image types if pytesseract is available
     "image/png": PYTESSERACT_AVAILABLE,
@@ -46,27 +45,48 @@ SUPPORTED_MIME_TYPES = {
     "image/bmp": PYTESSERACT_AVAILABLE,
 }
 
-# Maximum characters to send to LLM to avoid context window issues
+# Maximum characters to send to LLM in one prompt; longer reports are analyzed map-reduce style
 MAX_TEXT_LENGTH = 25000
+
+# Bump when extraction output changes (engines, preprocessing, budget) ...
+TEXT_EXTRACTION_VERSION = f"1:{REPORT_MAX_TEXT_CHARS}"
+# ... or when the analysis prompts / map-reduce strategy change (analyses are keyed by both versions)
+ANALYSIS_PROMPT_VERSION = "1"
 class ReportingAnalysisAgent:
     """
     A class to analyze medical report files (PDF, DOCX, Images) by extracting text,
     sending it to an LLM for analysis, and providing a simple explanation.
     """
 
-    def __init__(self):
-        self.llm = LLMManager()  # Initialize the LLM manager
-    def extract_text_from_bytes(file_bytes: bytes, mime_type: str) -> Optional[str]:
+    def __init__(self, use_llm_cache=True):
+        self.llm = LLMManager(use_cache=use_llm_cache)  # Identical reports get identical (cached) explanations
+
+    @staticmethod
+    def extract_text_from_bytes(file_bytes, mime_type: str, max_chars: Optional[int] = MAX_TEXT_LENGTH + 1) -> Optional[str]:
         """
         Extracts text content from file bytes based on the MIME type.
 
         Args:
-            file_bytes: The content of the file as bytes.
+            file_bytes: The content of the file (bytes, or a memoryview over a spooled upload).
             mime_type: The MIME type of the file (e.g., 'application/pdf').
+            max_chars: PDF extraction stops once this many characters are collected (None for everything).
 
         Returns:
             The extracted text as a string, or None if extraction fails or type is unsupported.
         """
+        return ReportingAnalysisAgent.extract_report_text(file_bytes, mime_type, max_chars)[0]
+
+    @staticmethod
+    @timed()
+    def extract_report_text(file_bytes, mime_type: str, max_chars: Optional[int] = MAX_TEXT_LENGTH + 1) -> Tuple[Optional[str], bool]:
+        """
+        Same as extract_text_from_bytes, also reporting whether the text is partial, i.e. OCR ran out
+        of its time budget. Stopping at `max_chars` does not count: it is deterministic for a given
+        budget, which is part of TEXT_EXTRACTION_VERSION.
+
+        Returns:
+            (extracted text or None, partial)
+        """
         print(f"Attempting text extraction for MIME type: {mime_type}")
 
         # Check if type is supported and library is available
@@ -75,31 +95,21 @@ class ReportingAnalysisAgent:
                 print(f"❌ Extraction skipped: Library for {mime_type} is not installed.")
             else:
                 print(f"❌ Extraction skipped: MIME type {mime_type} is not supported by this function.")
-            return None
+            return None, False
 
         extracted_text = ""
+        partial = False
 
         try:
             # --- PDF Handling ---
             if mime_type == "application/pdf":
-                pdf_file = io.BytesIO(file_bytes)
-                reader = PyPDF2.PdfReader(pdf_file)
-                num_pages = len(reader.pages)
-                print(f"  Processing PDF with {num_pages} pages...")
-                for i, page in enumerate(reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text:
-                            extracted_text += page_text + "\n\n"
-                        # else:
-                        #     print(f"    No text found on page {i+1}") # Optional logging
-                    except Exception as page_e:
-                        print(f"  ⚠️ Error extracting text from PDF page {i+1}: {page_e}")
+                print("  Processing PDF...")
+                extracted_text = extract_pdf_text(file_bytes, max_chars)
                 print(f"  Finished PDF processing.")
 
             # --- Word (.docx) Handling ---
             elif mime_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-                doc_file = io.BytesIO(file_bytes)
+                doc_file = BufferReader(file_bytes)
                 document = docx.Document(doc_file)
                 print("  Processing DOCX file...")
                 for para in document.paragraphs:
@@ -112,64 +122,65 @@ class ReportingAnalysisAgent:
             elif mime_type.startswith("image/"):
                 print("  Processing image file with OCR (Tesseract)...")
                 try:
-                    img = Image.open(io.BytesIO(file_bytes))
-                    # You might need preprocessing here for better OCR results (e.g., grayscale, thresholding)
-                    extracted_text = pytesseract.image_to_string(img)
+                    # Grayscale/threshold/deskew, multi-page TIFFs and tall-scan tiling happen in the pipeline
+                    extracted_text, partial = ocr_image_bytes(file_bytes)
                     print("  Finished OCR processing.")
                 except pytesseract.TesseractNotFoundError:
                     print("❌ OCR Error: Tesseract executable not found in your PATH.")
                     print("   Please install Tesseract OCR engine: https://github.com/tesseract-ocr/tesseract#installing-tesseract")
-                    return None
+                    return None, False
                 except Exception as ocr_e:
                     print(f"❌ An error occurred during OCR: {ocr_e}")
-                    return None
+                    return None, False
 
         except Exception as e:
             print(f"❌ An unexpected error occurred during text extraction for {mime_type}: {e}")
             import traceback
             traceback.print_exc() # Log full traceback for debugging
-            return None
+            return None, False
 
         cleaned_text = extracted_text.strip()
         if not cleaned_text:
             print("⚠️ No text could be extracted from the file.")
-            return None
+            return None, partial
 
-        print(f"✅ Text extracted successfully ({len(cleaned_text)} characters).")
-        return cleaned_text
+        print(f"✅ Text extracted successfully ({len(cleaned_text)} characters{', partial' if partial else ''}).")
+        return cleaned_text, partial
 
 
-    def analyze_report_file(self,file_bytes: bytes, mime_type: str) -> str:
+    @staticmethod
+    def split_sections(text: str, section_tokens: Optional[int] = None) -> List[str]:
         """
-        Analyzes a report file (Image, PDF, DOCX) by extracting text, sending it to
-        an LLM, and asking for a simple explanation.
+        Split report text into sections of at most ~`section_tokens` tokens, on line boundaries
+        so tables and lab values stay intact (over-long lines are hard-wrapped).
 
         Args:
-            file_bytes: The byte content of the report file.
-            mime_type: The MIME type of the file.
+            text: The extracted report text.
+            section_tokens: Section size in (estimated) tokens (defaults to REPORT_SECTION_TOKENS).
 
         Returns:
-            A string containing the LLM's analysis/summary in simple terms,
-            or an error message if processing fails.
+            The sections, in document order.
         """
-        print(f"\n--- Starting Report Analysis for type: {mime_type} ---")
-
-        # 1. Extract Text
-        extracted_text = self.extract_text_from_bytes(file_bytes, mime_type)
+        max_chars = (section_tokens or REPORT_SECTION_TOKENS) * 4
+        sections, current, current_len = [], [], 0
+        for line in text.splitlines():
+            pieces = [line[i:i + max_chars] for i in range(0, len(line), max_chars)] or [""]
+            for piece in pieces:
+                if current and current_len + len(piece) + 1 > max_chars:
+                    sections.append("\n".join(current).strip())
+                    current, current_len = [], 0
+                current.append(piece)
+                current_len += len(piece) + 1
+        if current:
+            sections.append("\n".join(current).strip())
+        return [section for section in sections if section]
 
-        if not extracted_text:
-            return "Error: Could not extract text from the provided file or the file type is not supported/library missing."
-
-        # 2. Check Text Length and Truncate if Necessary
-        if len(extracted_text) > MAX_TEXT_LENGTH:
-            print(f"⚠️ Extracted text ({len(extracted_text)} chars) exceeds maximum length ({MAX_TEXT_LENGTH}). Truncating.")
-            extracted_text = extracted_text[:MAX_TEXT_LENGTH] + "\n... [Content Truncated]"
-
-        # 3. Prepare Prompt for LLM
-        prompt = f"""
-        Here is the text extracted from a medical report:
+    @staticmethod
+    def _explanation_prompt(report_body: str, source: str = "the text extracted from a medical report") -> str:
+        return f"""
+        Here is {source}:
         --- START OF REPORT TEXT ---
-        {extracted_text}
+        {report_body}
         --- END OF REPORT TEXT ---
 
         Please analyze this medical report thoroughly and explain it in simple, easy-to-understand language for a layperson (someone without a medical background).
@@ -183,11 +194,120 @@ class ReportingAnalysisAgent:
         Structure your response clearly. Avoid overly technical jargon in your explanation. Ensure the tone is informative and helpful.
         """
 
-        # 4. Send to LLM using a temporary chat session
+    @staticmethod
+    def _section_prompt(section: str, index: int, total: int) -> str:
+        return f"""
+        Here is section {index} of {total} of the text extracted from a long medical report:
+        --- START OF SECTION ---
+        {section}
+        --- END OF SECTION ---
+
+        Write concise notes on this section only, for a later step that will combine the notes of all sections:
+        - Key findings, diagnoses and abnormal results (keep exact values, units and reference ranges).
+        - Medical terms that will need to be explained.
+        - Any conclusions, impressions, follow-up plans or recommendations stated here.
+
+        Use short bullet points. Do not speculate beyond the text, and write "No relevant findings." if there are none.
+        """
+
+    async def _map_sections(self, sections: List[str], concurrency: int) -> List[Optional[str]]:
+        """Analyze every section concurrently (bounded); returns notes in section order, None for failures."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def analyze(index: int, section: str) -> Optional[str]:
+            async with semaphore:
+                try:
+                    notes = await self.llm.asend_message_to_llm(self._section_prompt(section, index + 1, len(sections)))
+                except Exception as e:
+                    print(f"  ⚠️ Section {index + 1} analysis failed: {e}")
+                    return None
+            if not isinstance(notes, str) or not notes.strip() or notes.startswith("Error:"):
+                print(f"  ⚠️ Section {index + 1} analysis failed: {notes}")
+                return None
+            return notes.strip()
+
+        return await asyncio.gather(*(analyze(i, section) for i, section in enumerate(sections)))
+
+    async def _build_analysis_prompt(self, extracted_text: str) -> Optional[str]:
+        """
+        Single-shot prompt for short reports; for long ones, map the sections to notes concurrently
+        and return the reduce prompt over those notes (None if every section failed).
+        """
+        if len(extracted_text) <= MAX_TEXT_LENGTH:
+            return self._explanation_prompt(extracted_text)
+
+        sections = self.split_sections(extracted_text, REPORT_SECTION_TOKENS)
+        print(f"Long report ({len(extracted_text)} chars): map-reduce over {len(sections)} sections "
+              f"(concurrency {REPORT_MAP_CONCURRENCY})...")
+        notes = await self._map_sections(sections, REPORT_MAP_CONCURRENCY)
+        if not any(notes):
+            return None
+        merged = "\n\n".join(
+            f"[Section {i + 1} of {len(sections)}]\n{note or '(This section could not be analyzed.)'}"
+            for i, note in enumerate(notes)
+        )
+        return self._explanation_prompt(merged, "section-by-section notes taken from a long medical report, in document order")
+
+    @timed()
+    async def analyze_report_file(self,file_bytes, mime_type: str, sha256: Optional[str] = None) -> str:
+        """
+        Analyzes a report file (Image, PDF, DOCX) by extracting text, sending it to
+        an LLM, and asking for a simple explanation.
+        Reports longer than MAX_TEXT_LENGTH are analyzed map-reduce style: sections are summarized
+        concurrently and the final explanation is written from those notes.
+
+        Args:
+            file_bytes: The content of the report file (bytes or a memoryview over a spooled upload).
+            mime_type: The MIME type of the file.
+            sha256: Hex SHA-256 of the file; when given, extracted text and analyses are cached under it.
+
+        Returns:
+            A string containing the LLM's analysis/summary in simple terms,
+            or an error message if processing fails.
+        """
+        print(f"\n--- Starting Report Analysis for type: {mime_type} ---")
+        cache = report_result_cache if sha256 else None
+        analysis_key = f"{sha256}:{TEXT_EXTRACTION_VERSION}:{ANALYSIS_PROMPT_VERSION}:{self.llm._model}"
+        text_key = f"{sha256}:{mime_type}:{TEXT_EXTRACTION_VERSION}"
+        if cache:
+            cached_analysis = await asyncio.to_thread(cache.get_analysis, analysis_key)
+            if cached_analysis:
+                print("✅ Returning cached analysis for an identical file.")
+                return cached_analysis
+
+        # 1. Extract Text
+        # Extraction/OCR is CPU-bound, so keep it off the event loop
+        extracted_text = await asyncio.to_thread(cache.get_text, text_key) if cache else None
+        partial = False
+        if extracted_text:
+            print(f"Reusing cached extracted text ({len(extracted_text)} chars).")
+        else:
+            extracted_text, partial = await asyncio.to_thread(self.extract_report_text, file_bytes, mime_type, REPORT_MAX_TEXT_CHARS + 1)
+            # OCR that ran out of time is used for this answer but never cached: a retry may read the whole document
+            if extracted_text and cache and not partial:
+                await asyncio.to_thread(cache.set_text, text_key, extracted_text)
+
+        if not extracted_text:
+            return "Error: Could not extract text from the provided file or the file type is not supported/library missing."
+
+        # 2. Hard cap for pathological documents (map-reduce handles everything below it)
+        if len(extracted_text) > REPORT_MAX_TEXT_CHARS:
+            print(f"⚠️ Extracted text ({len(extracted_text)} chars) exceeds maximum length ({REPORT_MAX_TEXT_CHARS}). Truncating.")
+            extracted_text = extracted_text[:REPORT_MAX_TEXT_CHARS] + "\n... [Content Truncated]"
+
+        # 3. Prepare Prompt for LLM (map step runs here for long reports)
+        try:
+            prompt = await self._build_analysis_prompt(extracted_text)
+        except Exception as e:
+            print(f"❌ An unexpected error occurred while analyzing report sections: {e}")
+            return f"Error: An unexpected error occurred during LLM communication: {e}"
+        if prompt is None:
+            return "Error: None of the report sections could be analyzed by the model."
+
+        # 4. Send to LLM (the single-shot or reduce call)
         print("Sending extracted text to LLM for analysis...")
         try:
-            # Create a temporary chat session for this single analysis task
-            llm_response = self.llm.send_message_to_llm(prompt)
+            llm_response = await self.llm.asend_message_to_llm(prompt)
 
             # send_message_to_llm already handles basic error string formatting
             if isinstance(llm_response, str) and llm_response.startswith("Error:"):
@@ -198,10 +318,12 @@ class ReportingAnalysisAgent:
                 return "Error: Received an empty or invalid response from the analysis model."
             else:
                 print("✅ LLM analysis successful.")
+                if cache and not partial:
+                    await asyncio.to_thread(cache.set_analysis, analysis_key, llm_response.strip())
                 return llm_response.strip() # Return the successful analysis string
 
         except Exception as e:
             print(f"❌ An unexpected error occurred while communicating with the LLM: {e}")
             import traceback
             traceback.print_exc()
-            return f"Error: An unexpected error occurred during LLM communication: {e}"
\ No newline at end of file
+            return f"Error: An unexpected error occurred during LLM communication: {e}"
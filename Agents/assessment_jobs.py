@@ -0,0 +1,202 @@
+import time
+import uuid
+import asyncio
+import logging
+import contextvars
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from fastapi import HTTPException
+from config import ASSESS_JOB_WORKERS, ASSESS_JOB_QUEUE_DEPTH, ASSESS_JOB_TTL, ASSESS_JOB_MAX_RETAINED
+
+# Job states
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+# A job body: receives a progress callback `progress(stage, partial_payload)` and returns the final result
+JobRunner = Callable[[Callable[[str, Dict[str, Any]], Awaitable[None]]], Awaitable[Any]]
+
+
+class QueueFullError(Exception):
+    """Raised by AssessmentJobQueue.submit when the queue is at capacity."""
+
+
+class AssessmentJob:
+    """
+    One submitted assessment: its state, the stages it has completed (with their partial payloads)
+    and, once finished, the result or the error.
+    """
+
+    def __init__(self, runner: JobRunner, on_discard: Optional[Callable[[], Awaitable[None]]] = None):
+        self.job_id = str(uuid.uuid4())
+        self.status = QUEUED
+        self.stage: Optional[str] = None
+        self.stages: List[Dict[str, Any]] = []
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.error_status_code: Optional[int] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._runner = runner
+        self._on_discard = on_discard
+        # Notified on every state change, for long-polling clients
+        self._changed = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def record_stage(self, stage: str, payload: Dict[str, Any]):
+        self.stage = stage
+        self.stages.append({"stage": stage, "at": time.time(), "data": payload})
+        await self._notify()
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """Wait until the job changes state or completes another stage. Returns False on timeout."""
+        if timeout <= 0:
+            return False
+        async with self._changed:
+            if self.finished:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    def to_dict(self, queue_position: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": [{"stage": s["stage"], "at": s["at"]} for s in self.stages],
+            "queue_position": queue_position,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class AssessmentJobQueue:
+    """
+    Bounded asynchronous job runner: a fixed number of worker tasks consume a queue of limited
+    depth, so long assessments run outside the HTTP request without unbounded concurrency.
+    Finished jobs are kept for polling until their TTL runs out (or the retention cap is hit).
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 ttl_seconds: Optional[int] = None, max_retained: Optional[int] = None):
+        self.workers = workers or ASSESS_JOB_WORKERS
+        self.max_queue = max_queue or ASSESS_JOB_QUEUE_DEPTH
+        self.ttl_seconds = ttl_seconds or ASSESS_JOB_TTL
+        self.max_retained = max_retained or ASSESS_JOB_MAX_RETAINED
+        self._jobs: "OrderedDict[str, AssessmentJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+        self._counts = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+
+    def _ensure_workers(self):
+        # Created lazily so the queue and tasks belong to the server's running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            # Fresh context: workers outlive the request that happened to start them (and its per-request state)
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"assessment-worker-{len(self._tasks)}",
+                                                   context=contextvars.Context()))
+
+    def submit(self, runner: JobRunner, on_discard: Optional[Callable[[], Awaitable[None]]] = None) -> AssessmentJob:
+        """
+        Queue an assessment.
+
+        Args:
+            runner: Coroutine function running the assessment; it is given the job's progress callback.
+            on_discard: Cleanup coroutine run after the job finishes (e.g. closing its upload).
+
+        Returns:
+            AssessmentJob: The queued job.
+
+        Raises:
+            QueueFullError: If ASSESS_JOB_QUEUE_DEPTH jobs are already waiting.
+        """
+        self._ensure_workers()
+        self._evict_expired()
+        job = AssessmentJob(runner, on_discard)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._counts["rejected"] += 1
+            raise QueueFullError(f"Assessment queue is full ({self.max_queue} jobs waiting).")
+        self._counts["submitted"] += 1
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.max_retained:
+            oldest_id = next((jid for jid, j in self._jobs.items() if j.finished), None)
+            if oldest_id is None:
+                break
+            del self._jobs[oldest_id]
+        return job
+
+    def get(self, job_id: str) -> Optional[AssessmentJob]:
+        self._evict_expired()
+        return self._jobs.get(job_id)
+
+    def queue_position(self, job: AssessmentJob) -> Optional[int]:
+        """1-based position among the jobs still waiting, or None once the job has started."""
+        if job.status != QUEUED:
+            return None
+        waiting = [j for j in self._jobs.values() if j.status == QUEUED]
+        return waiting.index(job) + 1
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._running += 1
+            job.status, job.started_at = RUNNING, time.time()
+            await job._notify()
+            try:
+                job.result = await job._runner(job.record_stage)
+                job.status = SUCCEEDED
+                self._counts["succeeded"] += 1
+            except HTTPException as e:
+                job.status, job.error, job.error_status_code = FAILED, str(e.detail), e.status_code
+                self._counts["failed"] += 1
+            except Exception as e:
+                logging.exception(f'Assessment job {job.job_id} failed')
+                job.status, job.error, job.error_status_code = FAILED, f"Internal server error during assessment: {e}", 500
+                self._counts["failed"] += 1
+            finally:
+                job.finished_at = time.time()
+                self._running -= 1
+                self._queue.task_done()
+                if job._on_discard is not None:
+                    try:
+                        await job._on_discard()
+                    except Exception as e:
+                        logging.warning(f'Assessment job {job.job_id} cleanup failed: {e}')
+                job._runner = job._on_discard = None
+                await job._notify()
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [jid for jid, job in self._jobs.items() if job.finished and now - job.finished_at > self.ttl_seconds]
+        for jid in expired:
+            del self._jobs[jid]
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "retained_jobs": len(self._jobs),
+            **self._counts,
+        }
+
+
+assessment_jobs = AssessmentJobQueue()
@@ -1,11 +1,14 @@
 # Agents/chatbot.py
 
 import time
-from typing import Optional
+import asyncio
+from typing import List, Optional, Tuple
 
 # Import necessary functions from other modules
 from Agents.llms_manager_agent import LLMManager
 from Agents.search_agent import SearchAgent
+from Agents.conversation_context import ConversationContext
+from Agents.retrieval_index import retrieval_index
 
 class ChatbotAgent:
     """
@@ -14,41 +17,57 @@ class ChatbotAgent:
     based on user queries and conversation history, potentially augmented with web search results.
     """
 
-    def __init__(self):
+    def __init__(self, search_agent: Optional[SearchAgent] = None, use_llm_cache: bool = False):
         
         
-        self.llm = LLMManager()  # Initialize the LLM manager
-        self.search = SearchAgent()  # Initialize the search agent
+        self.llm = LLMManager(use_cache=use_llm_cache)  # Conversational replies are not cached by default
+        self.search = search_agent or SearchAgent(self.llm)  # Reuse the shared search agent when given
 
         
-    def generate_chat_response(self, user_query: str) -> str:
+    async def _gather_search_context(self, user_query: str) -> Tuple[List[str], str]:
         """
-        Generates a conversational response using the LLM, potentially augmenting
-        with web search results. Maintains the dermatologist persona set in the model's
-        system instructions and uses the provided chat session history.
+        Collects supporting passages for a chat turn.
+
+        The local retrieval index is tried first; a live web search (whose pages get indexed)
+        only runs when the index does not cover the query well enough.
+
+        Returns:
+            A (passages, source) tuple, where source is "index" or "web".
+        """
+        if retrieval_index is not None:
+            hits = await asyncio.to_thread(retrieval_index.search, user_query)
+            if retrieval_index.is_sufficient(user_query, hits):
+                print(f"  Answering from {len(hits)} indexed passages.")
+                return [f"[{hit['url']}] {hit['text']}" for hit in hits], "index"
+
+        print("  Index coverage is poor, performing web search for context...")
+        documents = await self.search.adeepsearch(user_query, max_results=3)
+        if retrieval_index is not None and documents:
+            # The fresh pages are indexed now; use their best passages rather than whole pages
+            hits = await asyncio.to_thread(retrieval_index.search, user_query)
+            if hits:
+                return [f"[{hit['url']}] {hit['text']}" for hit in hits], "web"
+        return documents, "web"
+
+    @staticmethod
+    def _build_prompt(user_query: str, search_context) -> str:
+        """
+        Combines the user query with supplemental search context.
 
         Args:
-            chat_session: The active ChatSession object containing conversation history.
             user_query: The latest message/query from the user.
+            search_context: Passages or page texts (may be empty).
 
         Returns:
-            The LLM's response string, or an error string beginning with "Error:".
+            The prompt to send to the LLM.
         """
-        print(f"Processing chat query within Chatbot Agent: '{user_query[:100]}...'")
-
-        search_context = ""
         max_search_chars = 5000 # Limit context size from search
 
-        # --- 1. Perform Web Search (if available) ---
-        print("  Performing web search for context...")
-        
-        # Using specific search_type="web"
-        search_context = self.search.deepsearch(user_query, max_results=3)
-            
-        # --- 2. Construct Prompt for LLM ---
         # We provide the user query and any supplemental search context.
         if search_context:
-            prompt = (f"""
+            if not isinstance(search_context, str):
+                search_context = "\n\n".join(str(passage) for passage in search_context)
+            return (f"""
             User Query: "{user_query}"
 
             Potentially relevant context from a web search:
@@ -58,14 +77,34 @@ class ChatbotAgent:
 
             Considering the conversation history AND the search context above, please respond to the User Query. Maintain your persona as a helpful, board-certified dermatologist AI assistant .
             """)
-        else:
-            # If no search context, just pass the user query directly
-            prompt = user_query # Simpler prompt, relying on history and system instruction
+        # If no search context, just pass the user query directly
+        return user_query # Simpler prompt, relying on history and system instruction
+
+    async def generate_chat_response(self, user_query: str, context: Optional[ConversationContext] = None) -> str:
+        """
+        Generates a conversational response using the LLM, potentially augmenting
+        with web search results. Maintains the dermatologist persona set in the model's
+        system instructions and uses the provided chat session history.
+
+        Args:
+            user_query: The latest message/query from the user.
+            context: The ConversationContext of the chat session.
+
+        Returns:
+            The LLM's response string, or an error string beginning with "Error:".
+        """
+        print(f"Processing chat query within Chatbot Agent: '{user_query[:100]}...'")
+
+        # --- 1. Retrieve context (local index first, live web search as fallback) ---
+        search_context, _ = await self._gather_search_context(user_query)
+            
+        # --- 2. Construct Prompt for LLM ---
+        prompt = self._build_prompt(user_query, search_context)
 
         # --- 3. Send to LLM ---
         # print("Sending query (with search context if available) to LLM via send_message_to_llm...")
-        # Use the imported send_message_to_llm function and the passed chat_session
-        llm_response = self.llm.send_message_to_llm(prompt)
+        # History of the session is carried (and bounded) by the passed context
+        llm_response = await self.llm.asend_message_to_llm(prompt, context)
 
         # --- 4. Handle Response ---
         # send_message_to_llm returns either the text response or an "Error: ..." string
@@ -77,5 +116,48 @@ class ChatbotAgent:
             return "Error: Received an empty response from the assistant."
         else:
             print("✅ Chatbot Agent received valid LLM response.")
-            # History in chat_session is automatically updated by the call to send_message_to_llm
-            return llm_response.strip()
\ No newline at end of file
+            # History in the context is updated by the call to asend_message_to_llm
+            return llm_response.strip()
+
+    async def stream_chat_response(self, user_query: str, context: Optional[ConversationContext] = None):
+        """
+        Streaming variant of generate_chat_response.
+
+        Args:
+            user_query: The latest message/query from the user.
+            context: The ConversationContext of the chat session.
+
+        Yields:
+            tuple: (event, data) pairs, in order:
+                ("status", {"stage": "searching"}), ("status", {"stage": "generating", ...}),
+                ("token", {"text": ...}) for every chunk of the answer, then
+                ("done", {"response": ...}) or ("error", {"detail": "Error: ..."}).
+        """
+        print(f"Streaming chat query within Chatbot Agent: '{user_query[:100]}...'")
+
+        yield "status", {"stage": "searching"}
+        try:
+            search_context, source = await self._gather_search_context(user_query)
+        except Exception as e:
+            # The answer can still be generated from the history alone
+            print(f"⚠️ Web search failed, answering without search context: {e}")
+            search_context, source = [], "none"
+
+        yield "status", {"stage": "generating", "search_documents": len(search_context), "source": source}
+        chunks = []
+        try:
+            async for chunk in self.llm.astream_message_to_llm(self._build_prompt(user_query, search_context), context):
+                chunks.append(chunk)
+                yield "token", {"text": chunk}
+        except Exception as e:
+            print(f"❌ LLM error while streaming chat response: {e}")
+            yield "error", {"detail": f"Error: {e}"}
+            return
+
+        llm_response = "".join(chunks).strip()
+        if not llm_response:
+            print("❌ LLM returned an empty response for chat query.")
+            yield "error", {"detail": "Error: Received an empty response from the assistant."}
+        else:
+            print("✅ Chatbot Agent streamed a valid LLM response.")
+            yield "done", {"response": llm_response}
@@ -0,0 +1,155 @@
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_KEEP_RECENT_TURNS, CONVERSATION_SESSION_TTL, CONVERSATION_MAX_SESSIONS
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English text).
+
+    Args:
+        text (str): Text to measure.
+
+    Returns:
+        int: Approximate number of tokens.
+    """
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+class ConversationContext:
+    """
+    Conversation history owned by a single request or chat session.
+
+    Keeps the most recent turns verbatim and folds older turns into a rolling
+    summary once the rendered history exceeds the token budget, so the prompt
+    sent to the LLM stays bounded however long the conversation runs.
+    """
+
+    def __init__(self, session_id: Optional[str] = None, token_budget: Optional[int] = None, keep_recent_turns: Optional[int] = None):
+        self.session_id = session_id or str(uuid.uuid4())
+        self.token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+        self.keep_recent_turns = keep_recent_turns if keep_recent_turns is not None else CONTEXT_KEEP_RECENT_TURNS
+        self.summary: str = ''
+        self.turns: List[Tuple[str, str]] = []  # (user prompt, AI response) pairs, oldest first
+        self.last_used = time.time()
+        # Serializes turns of the same session when requests overlap
+        self.lock = asyncio.Lock()
+
+    def history_text(self) -> str:
+        """Render the summary and stored turns in the USER/AI_RESPONSE transcript format."""
+        history = ''
+        if self.summary:
+            history += f"CONVERSATION SUMMARY: {self.summary}\n"
+        for user_prompt, response in self.turns:
+            history += f"USER: {user_prompt}\n"
+            history += f"AI_RESPONSE :{response}\n"
+        return history
+
+    def render(self, user_prompt: str) -> str:
+        """Return the history followed by the pending user prompt, ready to send to the LLM."""
+        self.last_used = time.time()
+        return self.history_text() + f"USER: {user_prompt}\n"
+
+    def add_turn(self, user_prompt: str, response: str):
+        """Record a completed exchange."""
+        self.turns.append((user_prompt, str(response)))
+        self.last_used = time.time()
+
+    def token_count(self) -> int:
+        return estimate_tokens(self.history_text())
+
+    def over_budget(self) -> bool:
+        return self.token_count() > self.token_budget
+
+    def turns_to_summarize(self) -> List[Tuple[str, str]]:
+        """Oldest turns that fall outside the verbatim window."""
+        cutoff = max(len(self.turns) - self.keep_recent_turns, 0)
+        return self.turns[:cutoff]
+
+    def apply_summary(self, summary: str, summarized_turns: int):
+        """Replace the first `summarized_turns` turns with an updated rolling summary."""
+        self.summary = summary.strip()
+        self.turns = self.turns[summarized_turns:]
+        self.enforce_budget()
+
+    def enforce_budget(self):
+        """
+        Hard fallback used when summarization is unavailable or not enough:
+        drop the oldest verbatim turns, then trim the summary, until the history fits.
+        """
+        while len(self.turns) > 1 and self.over_budget():
+            self.turns.pop(0)
+        if self.over_budget() and self.summary:
+            overflow_chars = (self.token_count() - self.token_budget) * 4
+            self.summary = self.summary[overflow_chars:] if overflow_chars < len(self.summary) else ''
+
+    def summary_prompt(self) -> str:
+        """Prompt asking the LLM to merge the existing summary with the turns being folded away."""
+        transcript = ''
+        for user_prompt, response in self.turns_to_summarize():
+            transcript += f"USER: {user_prompt}\nAI_RESPONSE :{response}\n"
+        return f"""
+        Summarize the dermatology consultation below so it can replace the original transcript.
+        Keep every clinically relevant fact: reported symptoms, answers to follow-up questions,
+        candidate and final diagnoses with confidence levels, and recommendations already given.
+        Drop pleasantries, repeated instructions and raw search context.
+        Return plain text only, at most {max(self.token_budget // 4, 100)} words.
+
+        --- PREVIOUS SUMMARY ---
+        {self.summary or 'None'}
+        --- TRANSCRIPT TO FOLD IN ---
+        {transcript}
+        """
+
+
+class ConversationStore:
+    """
+    In-memory registry of chat sessions with an idle TTL and a cap on the number of sessions.
+    """
+
+    def __init__(self, max_sessions: Optional[int] = None, ttl_seconds: Optional[int] = None):
+        self.max_sessions = max_sessions or CONVERSATION_MAX_SESSIONS
+        self.ttl_seconds = ttl_seconds or CONVERSATION_SESSION_TTL
+        self._sessions: "OrderedDict[str, ConversationContext]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: Optional[str] = None) -> ConversationContext:
+        """
+        Return the context for `session_id`, creating a fresh one if it is unknown or expired.
+
+        Args:
+            session_id (str, optional): Existing session ID supplied by the client.
+
+        Returns:
+            ConversationContext: The session's context (its session_id may differ from the one requested
+            if that session expired or never existed).
+        """
+        with self._lock:
+            self._evict_expired()
+            context = self._sessions.get(session_id) if session_id else None
+            if context is None:
+                context = ConversationContext(session_id=session_id)
+                self._sessions[context.session_id] = context
+            self._sessions.move_to_end(context.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return context
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [sid for sid, ctx in self._sessions.items() if now - ctx.last_used > self.ttl_seconds]
+        for sid in expired:
+            del self._sessions[sid]
@@ -1,14 +1,21 @@
 import re
 import json
+import asyncio
+from urllib.parse import urldefrag
 from Agents.llms_manager_agent import LLMManager
 from Agents.search_agent import SearchAgent
+from Agents.evidence_selector import EvidenceSelector
+from Agents.instrumentation import timed
 
 class DiagnosisAgent:
-    def __init__(self):
-      self.llm = LLMManager()
-      self.search= SearchAgent()
+    def __init__(self, search_agent=None, use_llm_cache=True):
+      self.llm = LLMManager(use_cache=use_llm_cache)
+      # Reuse the application's SearchAgent when given instead of building another one
+      self.search = search_agent or SearchAgent(self.llm)
+      self.evidence_selector = EvidenceSelector()
 
-    def extract_symptoms(self, statement):
+    @timed()
+    async def extract_symptoms(self, statement, context=None):
         """Extracts symptoms from the user statement using the LLM."""
         prompt = f"""
         Patient statement: "{statement}"
@@ -17,18 +24,19 @@ class DiagnosisAgent:
         Return ONLY a JSON array of uppercase strings (e.g., ["RASH", "ITCHING","PAIN","BLISTERS"]). If no clear symptoms are mentioned, return an empty array [].
         Do not include explanations or any text outside the JSON array.
         """
-        symptoms = self.llm.send_message_to_llm(prompt)
+        symptoms = await self.llm.asend_message_to_llm(prompt, context)
         return symptoms
 
-    def generate_diagnosis_questions(self, symptoms, statement):
+    @timed()
+    async def generate_diagnosis_questions(self, symptoms, statement, context=None):
         """
         Generates follow-up questions based on extracted symptoms and statement using the LLM.
         Does NOT handle user input; returns the list of questions.
 
         Args:
-            chat_session: The active chat session with the LLM.
             symptoms: A list of extracted symptoms.
             statement: The initial user statement or context.
+            context: ConversationContext of the current request, shared across the assessment steps.
 
         Returns:
             A list of question strings if successful, otherwise None.
@@ -48,10 +56,11 @@ class DiagnosisAgent:
         Return ONLY a **strict JSON array** containing exactly 5 strings (the questions). Do not include numbering, introductions, or any other text outside the JSON array.
         Example Format: ["How long have you had these symptoms?", "On a scale of 1-10, how severe is the itching?", ...]
         """
-        questionaire = self.llm.send_message_to_llm(prompt)
+        questionaire = await self.llm.asend_message_to_llm(prompt, context)
         return questionaire
 
-    def get_initial_diagnosis(self):
+    @timed()
+    async def get_initial_diagnosis(self, context=None):
         prompt = (
             "Using the chat history (patient statement, symptoms, follow-ups), perform an **initial dermatological analysis**. "
             "Return a **strict JSON object** with these keys:\n"
@@ -61,20 +70,103 @@ class DiagnosisAgent:
             "  • \"differential_diagnosis\": {\"Alt1\": \"reason\", \"Alt2\": \"reason\", \"Alt3\": \"reason\"}\n"
             "Do not include any extra keys or prose."
         )
-        init_diag = self.llm.send_message_to_llm(prompt)
+        init_diag = await self.llm.asend_message_to_llm(prompt, context)
         return init_diag
 
-    def deep_diagnosis_research(self, pre_diag_dict):
-        disease_search = []
-        for disease in pre_diag_dict.keys():
-            deep_search = self.search.deepsearch(disease)
-            disease_search.extend(deep_search)
-        return disease_search
+    @staticmethod
+    def candidate_diseases(pre_diag_dict):
+        """
+        Candidate disease names from the initial diagnosis JSON.
+
+        Uses "most_likely_diagnosis" and the keys of "diseases"; a dict without those keys is
+        treated as a plain {disease: confidence} mapping.
+        """
+        candidates = []
+        if isinstance(pre_diag_dict, dict):
+            most_likely = pre_diag_dict.get("most_likely_diagnosis")
+            if isinstance(most_likely, str):
+                candidates.append(most_likely)
+            diseases = pre_diag_dict.get("diseases")
+            if isinstance(diseases, dict):
+                candidates.extend(diseases.keys())
+            if not candidates:
+                candidates = list(pre_diag_dict.keys())
+
+        unique = []
+        for candidate in candidates:
+            candidate = str(candidate).strip()
+            if candidate and candidate.lower() not in (c.lower() for c in unique):
+                unique.append(candidate)
+        return unique
+
+    @timed()
+    async def deep_diagnosis_research(self, pre_diag_dict, max_results=5):
+        """
+        Research every candidate disease concurrently.
+
+        The searches for all candidates run in parallel, the returned URLs are de-duplicated across
+        candidates, and each unique page is scraped once in a single concurrent batch.
+
+        Args:
+            pre_diag_dict: Initial diagnosis JSON (see get_initial_diagnosis).
+            max_results: Search results per candidate.
+
+        Returns:
+            list: One dict per scraped page: {"url", "candidates" (diseases whose search returned it), "text"}.
+        """
+        candidates = self.candidate_diseases(pre_diag_dict)
+        searches = await asyncio.gather(
+            *(asyncio.to_thread(self.search.search_articles, disease, max_results) for disease in candidates),
+            return_exceptions=True,
+        )
+
+        pages = {}  # normalized url -> {"url", "candidates"}, in first-seen order
+        for disease, search_results in zip(candidates, searches):
+            if isinstance(search_results, Exception):
+                print(f"⚠️ Search failed for {disease}: {search_results}")
+                continue
+            for article in self.search.articles_url(search_results, max_results):
+                key = urldefrag(article['url'])[0].rstrip('/')
+                page = pages.setdefault(key, {"url": article['url'], "candidates": []})
+                if disease not in page["candidates"]:
+                    page["candidates"].append(disease)
+
+        print(f"  Researching {len(candidates)} candidates: {len(pages)} unique pages")
+        texts = await self.search.afetch_pages([page["url"] for page in pages.values()])
+        return [{**page, "text": text} for page, text in zip(pages.values(), texts) if text]
+
+    @timed()
+    async def get_final_diagnosis(self, deep_research, context=None, symptoms=None, candidates=None):
+        """
+        Asks the LLM for the final diagnosis, grounded on the most relevant research passages.
+
+        Args:
+            deep_research: Pages returned by deep_diagnosis_research.
+            context: ConversationContext of the current assessment.
+            symptoms: Extracted symptoms, used to rank the research passages.
+            candidates: Candidate diseases; defaults to the candidates recorded on the research pages.
+
+        Returns:
+            The parsed final diagnosis JSON.
+        """
+        if candidates is None:
+            candidates = []
+            for doc in deep_research:
+                for disease in (doc.get('candidates', []) if isinstance(doc, dict) else []):
+                    if disease not in candidates:
+                        candidates.append(disease)
+        if isinstance(symptoms, str):
+            symptoms = [symptoms]
+        elif not isinstance(symptoms, list):
+            symptoms = []
 
-    def get_final_diagnosis(self, deep_research):
-        joined_research = " ".join(deep_research)
+        # Only the best passages within the token budget go into the prompt, not every scraped page
+        evidence = self.evidence_selector.select(deep_research, candidates, [str(s) for s in symptoms])
+        print(f"  Selected {len(evidence)} research passages for the final diagnosis")
+        joined_research = self.evidence_selector.format(evidence)
         prompt = (
-            f"Considering the deep research texts {joined_research} and prior chat history, select the **one** best final diagnosis. "
+            f"Considering the deep research texts below and prior chat history, select the **one** best final diagnosis.\n"
+            f"--- START RESEARCH ---\n{joined_research}\n--- END RESEARCH ---\n"
             "Return a **strict JSON** with:\n"
             "  • \"disease\": string\n"
             "  • \"justification\": string\n"
@@ -87,5 +179,5 @@ class DiagnosisAgent:
             "  • \"conclusion\": string\n"
             "No extra commentary—only this JSON."
         )
-        final_diag = self.llm.send_message_to_llm(prompt)
+        final_diag = await self.llm.asend_message_to_llm(prompt, context)
         return final_diag
@@ -0,0 +1,168 @@
+import re
+import math
+import hashlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from config import EVIDENCE_TOKEN_BUDGET, EVIDENCE_CHUNK_TOKENS
+from Agents.conversation_context import estimate_tokens
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "by", "is", "are", "was", "were",
+    "be", "as", "at", "it", "its", "this", "that", "from", "can", "may", "your", "you", "if", "not", "no",
+    "i", "me", "my", "do", "does", "what", "how", "why", "when", "which", "should", "about", "have", "has",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_text(text: str, chunk_tokens: Optional[int] = None) -> List[str]:
+    """
+    Split text into chunks of roughly `chunk_tokens` tokens on sentence boundaries.
+
+    Args:
+        text (str): Text to split.
+        chunk_tokens (int, optional): Target chunk size in (estimated) tokens.
+
+    Returns:
+        list: Chunks in document order.
+    """
+    max_chars = (chunk_tokens or EVIDENCE_CHUNK_TOKENS) * 4
+    chunks, current = [], ""
+    for sentence in SENTENCE_RE.split(text):
+        # Hard-wrap run-on "sentences" such as navigation menus
+        while len(sentence) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current.strip():
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+
+class BM25:
+    """Okapi BM25 over a fixed list of tokenized documents."""
+
+    def __init__(self, tokenized_docs: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(doc) for doc in tokenized_docs]
+        self.doc_lengths = [len(doc) for doc in tokenized_docs]
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if tokenized_docs else 0.0
+        doc_freqs = Counter(term for doc in self.term_freqs for term in doc)
+        n = len(tokenized_docs)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+    def scores(self, query_tokens: Iterable[str]) -> List[float]:
+        query_terms = [term for term in set(query_tokens) if term in self.idf]
+        results = []
+        for tf, length in zip(self.term_freqs, self.doc_lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in query_terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            results.append(score)
+        return results
+
+
+class EvidenceSelector:
+    """
+    Picks the most relevant passages of the deep-research pages for the final diagnosis prompt.
+
+    Pages are chunked, boilerplate duplicates (menus, footers shared by many pages) are dropped,
+    chunks are ranked with BM25 against each candidate disease plus the extracted symptoms, and
+    the best chunks are taken round-robin across candidates until the token budget is filled.
+    """
+
+    SYMPTOM_WEIGHT = 0.5
+
+    def __init__(self, token_budget: Optional[int] = None, chunk_tokens: Optional[int] = None):
+        self.token_budget = token_budget or EVIDENCE_TOKEN_BUDGET
+        self.chunk_tokens = chunk_tokens or EVIDENCE_CHUNK_TOKENS
+
+    def select(self, documents: List[Dict], candidates: List[str], symptoms: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Args:
+            documents: Research pages as returned by DiagnosisAgent.deep_diagnosis_research
+                ({"url", "candidates", "text"}); plain strings are accepted too.
+            candidates: Candidate disease names.
+            symptoms: Extracted symptoms.
+
+        Returns:
+            list: Selected chunks {"url", "candidates", "text", "score"}, ordered by source and position.
+        """
+        chunks, seen = [], set()
+        for doc_index, doc in enumerate(documents):
+            if isinstance(doc, dict):
+                url, doc_candidates, text = doc.get("url", ""), doc.get("candidates", []), doc.get("text", "")
+            else:
+                url, doc_candidates, text = "", [], str(doc)
+            for position, chunk in enumerate(chunk_text(text, self.chunk_tokens)):
+                fingerprint = hashlib.sha1(" ".join(tokenize(chunk)).encode("utf-8")).hexdigest()
+                if fingerprint in seen:
+                    continue
+                seen.add(fingerprint)
+                chunks.append({"url": url, "candidates": doc_candidates, "text": chunk,
+                               "doc": doc_index, "position": position, "tokens": tokenize(chunk)})
+        if not chunks:
+            return []
+
+        bm25 = BM25([chunk["tokens"] for chunk in chunks])
+        symptom_scores = bm25.scores(tokenize(" ".join(symptoms or [])))
+        rankings = []
+        for candidate in candidates:
+            # A chunk must mention the candidate to rank for it; symptoms break ties between those chunks
+            candidate_scores = bm25.scores(tokenize(candidate))
+            rankings.append(sorted(
+                ((score + self.SYMPTOM_WEIGHT * symptom_scores[i], i) for i, score in enumerate(candidate_scores) if score > 0),
+                reverse=True,
+            ))
+        if not any(rankings):
+            rankings = [sorted(((score, i) for i, score in enumerate(symptom_scores) if score > 0), reverse=True)]
+
+        selected, used_tokens, taken = [], 0, set()
+        cursors = [0] * len(rankings)
+        while True:
+            progressed = False
+            for r, ranking in enumerate(rankings):
+                while cursors[r] < len(ranking) and ranking[cursors[r]][1] in taken:
+                    cursors[r] += 1
+                if cursors[r] >= len(ranking):
+                    continue
+                score, i = ranking[cursors[r]]
+                cursors[r] += 1
+                taken.add(i)
+                progressed = True
+                cost = estimate_tokens(chunks[i]["text"])
+                if used_tokens + cost > self.token_budget:
+                    continue
+                used_tokens += cost
+                selected.append({**chunks[i], "score": round(score, 3)})
+            if not progressed:
+                break
+
+        selected.sort(key=lambda chunk: (chunk["doc"], chunk["position"]))
+        return [{key: chunk[key] for key in ("url", "candidates", "text", "score")} for chunk in selected]
+
+    @staticmethod
+    def format(selected: List[Dict]) -> str:
+        """Render selected chunks with numbered source attribution for the prompt."""
+        sources: Dict[str, int] = {}
+        blocks = []
+        for chunk in selected:
+            number = sources.setdefault(chunk["url"], len(sources) + 1)
+            relevant = f" | Relevant to: {', '.join(chunk['candidates'])}" if chunk["candidates"] else ""
+            blocks.append(f"[Source {number}: {chunk['url'] or 'unknown'}{relevant}]\n{chunk['text']}")
+        return "\n\n".join(blocks)
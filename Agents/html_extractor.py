@@ -0,0 +1,194 @@
+from typing import List, Optional
+from bs4 import BeautifulSoup
+from config import HTML_EXTRACTOR_ENGINE, SCRAPER_MAX_TEXT_CHARS
+
+# Fast C-backed parser (optional; falls back to BeautifulSoup's html.parser)
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+    print("⚠️ Warning: lxml not found. Falling back to the slower BeautifulSoup html.parser for scraping.")
+    print("   Install it: pip install lxml")
+
+# Subtrees whose text never belongs to the article. Layout wrappers such as <form> (ASP.NET
+# WebForms wraps the whole body in one) and <aside> are deliberately kept.
+SKIP_TAGS = {"head", "script", "style", "noscript", "template", "svg", "nav", "footer", "iframe"}
+
+# Once this much body text has been seen without finding a content container, stop parsing
+BODY_SCAN_FACTOR = 3
+
+
+def _container_priority(tag: str, attrib) -> Optional[int]:
+    """Rank of a main-content container, mirroring the original lookup order (lower is better)."""
+    if tag == "main":
+        return 0
+    if tag == "article":
+        return 1
+    if tag == "div":
+        classes = (attrib.get("class") or "").split()
+        if "content" in classes:
+            return 2
+        if "page-content" in classes:
+            return 3
+        if attrib.get("id") == "main-content":
+            return 4
+    return None
+
+
+class _MainTextCollector:
+    """lxml parser target collecting body and container text while the document streams in."""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.depth = 0
+        self.skip_depth = 0
+        self.pending: List[str] = []
+        self.body_parts: List[str] = []
+        self.body_chars = 0
+        self.containers = {}  # priority -> [parts, chars]
+        self.open_containers = []  # (priority, depth)
+        self.done = False
+
+    def _flush(self):
+        if not self.pending:
+            return
+        text = "".join(self.pending).strip()
+        self.pending = []
+        if not text or self.done:
+            return
+        self.body_parts.append(text)
+        self.body_chars += len(text) + 1
+        for priority, _ in self.open_containers:
+            container = self.containers[priority]
+            container[0].append(text)
+            container[1] += len(text) + 1
+            if priority == 0 and container[1] >= self.max_chars:
+                self.done = True
+        if not self.containers and self.body_chars >= self.max_chars * BODY_SCAN_FACTOR:
+            self.done = True
+
+    def start(self, tag, attrib):
+        self._flush()
+        self.depth += 1
+        if self.skip_depth or tag in SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        priority = _container_priority(tag, attrib)
+        if priority is not None and priority not in self.containers:
+            self.containers[priority] = [[], 0]
+            self.open_containers.append((priority, self.depth))
+
+    def end(self, tag):
+        self._flush()
+        if self.skip_depth:
+            self.skip_depth -= 1
+        else:
+            for priority, depth in list(self.open_containers):
+                if depth == self.depth:
+                    self.open_containers.remove((priority, depth))
+                    if priority == 0:
+                        # <main> is the preferred container; nothing later can beat it
+                        self.done = True
+        self.depth -= 1
+
+    def data(self, data):
+        if not self.skip_depth:
+            self.pending.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self) -> str:
+        self._flush()
+        if self.containers:
+            parts = self.containers[min(self.containers)][0]
+        else:
+            parts = self.body_parts
+        return " ".join(parts)[:self.max_chars]
+
+
+class StreamingExtractor:
+    """
+    Incremental main-content extractor: feed HTML chunks as they arrive, stop feeding once `done`.
+
+    Uses lxml's C parser with a streaming target, skipping script/style/nav/footer subtrees and
+    stopping early once enough main-content text has been collected.
+    """
+
+    def __init__(self, max_chars: Optional[int] = None):
+        if not LXML_AVAILABLE:
+            raise RuntimeError("lxml is required for StreamingExtractor")
+        self.collector = _MainTextCollector(max_chars or SCRAPER_MAX_TEXT_CHARS)
+        self.parser = etree.HTMLParser(target=self.collector, recover=True, remove_comments=True)
+
+    @property
+    def done(self) -> bool:
+        return self.collector.done
+
+    def feed(self, chunk: str) -> bool:
+        """Feed the next piece of HTML. Returns True when no more input is needed."""
+        if not self.collector.done:
+            self.parser.feed(chunk)
+        return self.collector.done
+
+    def close(self) -> str:
+        """Finish parsing and return the extracted text."""
+        try:
+            return self.parser.close()
+        except etree.LxmlError:
+            return self.collector.close()
+
+
+def extract_main_text_lxml(html: str, max_chars: Optional[int] = None, chunk_size: int = 64 * 1024) -> str:
+    """Extract main-content text with the streaming lxml engine."""
+    extractor = StreamingExtractor(max_chars)
+    for start in range(0, len(html), chunk_size):
+        if extractor.feed(html[start:start + chunk_size]):
+            break
+    return extractor.close()
+
+
+def extract_main_text_bs4(html: str, max_chars: Optional[int] = None) -> str:
+    """Extract main-content text with BeautifulSoup's html.parser (the original implementation)."""
+    soup = BeautifulSoup(html, 'html.parser')
+    main_content = (
+        soup.find('main') or
+        soup.find('article') or
+        soup.find('div', class_='content') or
+        soup.find('div', class_='page-content') or
+        soup.find('div', id='main-content')
+    )
+    if main_content:
+        text = main_content.get_text(separator=' ', strip=True)
+    else:
+        body = soup.find('body')
+        text = body.get_text(separator=' ', strip=True) if body else ''
+    return text[:max_chars or SCRAPER_MAX_TEXT_CHARS]
+
+
+EXTRACTION_ENGINES = {
+    "lxml": extract_main_text_lxml,
+    "bs4": extract_main_text_bs4,
+}
+
+
+def extract_main_text(html: str, max_chars: Optional[int] = None, engine: Optional[str] = None) -> str:
+    """
+    Extract the main textual content of an HTML page.
+
+    Args:
+        html (str): Raw HTML.
+        max_chars (int, optional): Cap on the returned text (defaults to SCRAPER_MAX_TEXT_CHARS).
+        engine (str, optional): "lxml" or "bs4" (defaults to HTML_EXTRACTOR_ENGINE; lxml falls back
+            to bs4 when it is not installed).
+
+    Returns:
+        str: Text of the main/article container, or of the whole body when none is found.
+    """
+    engine = engine or HTML_EXTRACTOR_ENGINE
+    if engine == "lxml" and not LXML_AVAILABLE:
+        engine = "bs4"
+    if engine not in EXTRACTION_ENGINES:
+        raise ValueError(f"Unknown HTML extraction engine: {engine}")
+    return EXTRACTION_ENGINES[engine](html, max_chars)
@@ -1,9 +1,11 @@
 import os
+import base64
 from fastapi import  File, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from config import ALLOWED_IMAGE_EXTENSIONS, ALLOWED_AUDIO_EXTENSIONS, UPLOAD_FOLDER
-import mimetypes
 from typing import Optional
 from Agents.llms_manager_agent import LLMManager
+from Agents.upload_handler import SpooledUpload, spool_upload
 class InputAgent:
 
     def __init__(self):
@@ -26,37 +28,50 @@ class InputAgent:
             raise ValueError("Invalid audio file extension.")
         return True
     
+    @staticmethod
+    def is_image_mime_type(mime_type: str) -> bool:
+        # ALLOWED_IMAGE_EXTENSIONS holds extensions ('png', 'jpeg', ...), which match the MIME subtypes
+        major, _, subtype = mime_type.partition('/')
+        return major == 'image' and subtype in ALLOWED_IMAGE_EXTENSIONS
+
+    @staticmethod
+    def data_url(content, mime_type: str) -> str:
+        """Inline an uploaded file as a base64 data URL (the form the LLM's image_url parts accept)"""
+        return f"data:{mime_type};base64,{base64.b64encode(content).decode('ascii')}"
+
     # --- Helper Function for Input Processing ---
-    # ... (process_input remains the same) ...
-    async def process_input(self, text_input: Optional[str], file_input: Optional[UploadFile]) -> tuple[str, Optional[str], Optional[bytes], Optional[str]]:
-        """Processes text or file input, returning initial statement, visual description, content, mime type."""
+    async def process_input(self, text_input: Optional[str], file_input: Optional[UploadFile]) -> tuple[str, Optional[str], Optional[SpooledUpload], Optional[str]]:
+        """Processes text or file input, returning initial statement, visual description, spooled upload, mime type."""
+        upload = await spool_upload(file_input) if file_input else None
+        return await self.process_spooled_input(text_input, upload)
+
+    async def process_spooled_input(self, text_input: Optional[str], upload: Optional[SpooledUpload]) -> tuple[str, Optional[str], Optional[SpooledUpload], Optional[str]]:
+        """
+        Same as process_input, for an upload that was already size-checked and hashed by spool_upload.
+        The upload is closed before returning (its size/sha256 stay readable).
+        """
         initial_statement = ""
         visual_description = None
-        file_content = None
         mime_type = None
 
-        if file_input:
-            file_content = await file_input.read()
-            mime_type = file_input.content_type
-            if not mime_type or mime_type == 'application/octet-stream':
-                mime_type, _ = mimetypes.guess_type(file_input.filename)
-                print(f"Guessed MIME type as: {mime_type} for file {file_input.filename}")
-
+        if upload:
+            mime_type = upload.mime_type
             if not mime_type:
-                await file_input.close()
-                raise HTTPException(status_code=415, detail=f"Could not determine MIME type for file: {file_input.filename}")
+                await upload.close()
+                raise HTTPException(status_code=415, detail=f"Could not determine MIME type for file: {upload.filename}")
 
-            print(f"Processing uploaded file: {file_input.filename}, Type: {mime_type}")
+            print(f"Processing uploaded file: {upload.filename}, Type: {mime_type}, {upload.size} bytes")
 
-            if mime_type in ALLOWED_IMAGE_EXTENSIONS:
+            if self.is_image_mime_type(mime_type):
                 print("Input is an image. Generating visual description...")
-                visual_description = self.llm.describe_visuals(file_content, mime_type)
+                image_url = await run_in_threadpool(self.data_url, upload.buffer(), mime_type)
+                visual_description = await self.llm.adescribe_visuals(image_url, mime_type)
                 if isinstance(visual_description, str) and visual_description.startswith("Error:"):
-                    await file_input.close()
+                    await upload.close()
                     raise HTTPException(status_code=500, detail=f"Failed to analyze image: {visual_description}")
 
                 summary_prompt = f"Based on the following detailed visual description of a skin condition, create a concise one-sentence summary statement suitable as an initial patient complaint:\n\n{visual_description}"
-                initial_statement_raw = self.llm.send_message_to_llm( summary_prompt)
+                initial_statement_raw = await self.llm.asend_message_to_llm(summary_prompt)
                 if isinstance(initial_statement_raw, str) and not initial_statement_raw.startswith("Error:"):
                     initial_statement = f"Image analysis summary: {initial_statement_raw.strip()}"
                 else:
@@ -65,10 +80,10 @@ class InputAgent:
 
             
             else:
-                await file_input.close()
+                await upload.close()
                 raise HTTPException(status_code=415, detail=f"Unsupported file type for initial assessment intake: {mime_type}. Use /analyze_report for PDF/DOCX/Image analysis.")
 
-            await file_input.close()
+            await upload.close()
 
         elif text_input:
             initial_statement = text_input.strip()
@@ -79,6 +94,4 @@ class InputAgent:
         if not initial_statement:
             raise HTTPException(status_code=500, detail="Failed to establish an initial statement from input.")
 
-        return initial_statement, visual_description, file_content, mime_type
-
-
+        return initial_statement, visual_description, upload, mime_type
@@ -0,0 +1,270 @@
+import time
+import bisect
+import asyncio
+import inspect
+import functools
+import threading
+import contextvars
+from typing import Dict, List, Optional, Tuple
+from config import METRICS_ENABLED
+
+# Latency buckets (seconds): LLM calls and deep research land in the upper range
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+# Distinct stage names reported in one Server-Timing header
+MAX_SERVER_TIMING_ENTRIES = 30
+
+# Stages timed during the current request: name -> [total seconds, calls]. Set by ServerTimingMiddleware;
+# copied into threadpool work and tasks spawned by the request, which append to the same dict.
+_request_stages: contextvars.ContextVar[Optional[Dict[str, List[float]]]] = contextvars.ContextVar("request_stages", default=None)
+# Guards every request's stages dict: threadpool work of one request updates it concurrently
+_request_stages_lock = threading.Lock()
+# Stages currently being timed in this context; nested (e.g. recursive) calls of one of them are not recorded again
+_active_stages: contextvars.ContextVar[frozenset] = contextvars.ContextVar("active_stages", default=frozenset())
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in tuple(zip(names, values)) + extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                value = int(value) if value.is_integer() else value
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with labels (Prometheus semantics)."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labelvalues, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.labelnames, labelvalues, (("le", le),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, labelvalues)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """The process-wide set of metrics exported at /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+stage_duration = registry.register(Histogram(
+    "dermaai_stage_duration_seconds", "Latency of instrumented agent methods.", ("stage", "outcome")))
+stage_calls = registry.register(Counter(
+    "dermaai_stage_calls_total", "Calls of instrumented agent methods.", ("stage", "outcome")))
+http_duration = registry.register(Histogram(
+    "dermaai_http_request_duration_seconds", "Time to the response headers of HTTP requests.", ("method", "route", "status")))
+http_requests = registry.register(Counter(
+    "dermaai_http_requests_total", "HTTP requests served.", ("method", "route", "status")))
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def record_stage(stage: str, seconds: float, outcome: str = "ok"):
+    """Record one timed call in the aggregate metrics and in the current request's breakdown."""
+    stage_duration.observe(seconds, stage, outcome)
+    stage_calls.inc(stage, outcome)
+    stages = _request_stages.get()
+    if stages is not None:
+        with _request_stages_lock:
+            entry = stages.get(stage)
+            if entry is not None:
+                entry[0] += seconds
+                entry[1] += 1
+            elif len(stages) < MAX_SERVER_TIMING_ENTRIES:
+                stages[stage] = [seconds, 1]
+
+
+def timed(stage: Optional[str] = None):
+    """
+    Decorator recording the latency and outcome of a function under `stage` (defaults to its
+    qualified name, e.g. "DiagnosisAgent.get_final_diagnosis"). Works on plain functions, coroutine
+    functions and async generators (timed from the first step until exhausted or closed).
+    Only the outermost call of a stage is recorded: a call made while the same stage is already
+    being timed in this context (recursion, or a `stage` name shared by a function and one it
+    calls) would count the same time twice. For static methods, apply it below @staticmethod.
+    """
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+        name = stage or func.__qualname__
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                active = _active_stages.get()
+                generator = func(*args, **kwargs)
+                if name in active:
+                    try:
+                        async for item in generator:
+                            yield item
+                    finally:
+                        await generator.aclose()
+                    return
+                start, outcome = time.perf_counter(), "error"
+                try:
+                    while True:
+                        # Mark the stage active only while the generator runs, not while the consumer does
+                        token = _active_stages.set(active | {name})
+                        try:
+                            item = await generator.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            _active_stages.reset(token)
+                        yield item
+                    outcome = "ok"
+                except (GeneratorExit, asyncio.CancelledError):
+                    outcome = "cancelled"
+                    raise
+                finally:
+                    await generator.aclose()
+                    record_stage(name, time.perf_counter() - start, outcome)
+            return async_gen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                active = _active_stages.get()
+                if name in active:
+                    return await func(*args, **kwargs)
+                token = _active_stages.set(active | {name})
+                start, outcome = time.perf_counter(), "error"
+                try:
+                    result = await func(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                except asyncio.CancelledError:
+                    outcome = "cancelled"
+                    raise
+                finally:
+                    _active_stages.reset(token)
+                    record_stage(name, time.perf_counter() - start, outcome)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            active = _active_stages.get()
+            if name in active:
+                return func(*args, **kwargs)
+            token = _active_stages.set(active | {name})
+            start, outcome = time.perf_counter(), "error"
+            try:
+                result = func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                _active_stages.reset(token)
+                record_stage(name, time.perf_counter() - start, outcome)
+        return wrapper
+    return decorator
+
+
+def server_timing_header(stages: Dict[str, List[float]], total: float) -> str:
+    """Render a per-request breakdown as a Server-Timing header value (durations in ms)."""
+    entries = [f'{name};dur={seconds * 1000:.1f};desc="{int(calls)} call{"s" if calls != 1 else ""}"'
+               for name, (seconds, calls) in stages.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware collecting the stages timed while a request is handled: they are returned in
+    a `Server-Timing` header and the request itself is recorded in the HTTP metrics.
+    Stages that finish after the headers are sent (streamed responses) only reach the aggregates.
+    """
+
+    def __init__(self, app, exclude_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            return await self.app(scope, receive, send)
+
+        stages: Dict[str, List[float]] = {}
+        token = _request_stages.set(stages)
+        start = time.perf_counter()
+        status = 500
+
+        async def timing_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                with _request_stages_lock:
+                    snapshot = {stage: list(entry) for stage, entry in stages.items()}
+                header = server_timing_header(snapshot, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+                route = scope.get("route")
+                labels = (scope["method"], getattr(route, "path", "unmatched"), str(status))
+                http_duration.observe(time.perf_counter() - start, *labels)
+                http_requests.inc(*labels)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timing_send)
+        finally:
+            _request_stages.reset(token)
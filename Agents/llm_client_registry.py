@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional, Tuple
+from langchain_google_genai import ChatGoogleGenerativeAI
+from config import LLM_MAX_CONCURRENCY
+
+
+class LLMClientRegistry:
+    """
+    Process-wide pool of Gemini chat clients.
+
+    One ChatGoogleGenerativeAI instance is built per (model, temperature, max_tokens, timeout, api_key)
+    and shared by every LLMManager asking for the same configuration, so the underlying HTTP
+    connections are reused instead of every agent opening its own. The registry is also the single
+    place where the number of in-flight LLM calls is capped.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = max_concurrency or LLM_MAX_CONCURRENCY
+        self._clients: Dict[Tuple, ChatGoogleGenerativeAI] = {}
+        self._lock = threading.Lock()
+        self._sync_slots = threading.BoundedSemaphore(self.max_concurrency)
+        # asyncio semaphores are bound to the loop they are first awaited on
+        self._async_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self.in_flight = 0
+
+    def get_client(self, model: str, api_key: str, temperature: float, max_tokens=None, timeout=None) -> ChatGoogleGenerativeAI:
+        """
+        Return the shared client for this configuration, creating it on first use.
+
+        Raises:
+            RuntimeError: If the client cannot be initialized.
+        """
+        key = (model, temperature, max_tokens, timeout, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                try:
+                    client = ChatGoogleGenerativeAI(
+                        model=model,
+                        api_key=api_key,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        timeout=timeout,
+                        max_retries=2,
+                    )
+                except Exception as e:
+                    raise RuntimeError(f"Failed to initialize Gemini LLM: {e}")
+                self._clients[key] = client
+            return client
+
+    @contextmanager
+    def sync_slot(self):
+        """Hold one of the concurrency slots for a blocking LLM call."""
+        with self._sync_slots:
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """Hold one of the concurrency slots for an awaited LLM call."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            slots = self._async_slots.get(loop)
+            if slots is None:
+                slots = self._async_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        async with slots:
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+        }
+
+
+# Shared by every LLMManager in the process
+llm_client_registry = LLMClientRegistry()
@@ -0,0 +1,126 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+from Agents.sqlite_tier import open_disk_tier, evict_by_count, delete_expired
+from config import LLM_CACHE_ENABLED, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL, LLM_CACHE_DB_PATH, LLM_CACHE_DISK_MAX_ENTRIES
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of LLM responses.
+
+    Two tiers: an in-memory LRU with TTL for the hot set, and an optional SQLite table that
+    survives restarts. Entries are keyed by a SHA-256 of everything that determines the
+    response (model, system instructions, prompt and generation parameters).
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[int] = None,
+                 db_path: Optional[str] = None, disk_max_entries: Optional[int] = None):
+        self.max_entries = max_entries or LLM_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or LLM_CACHE_TTL
+        self.disk_max_entries = disk_max_entries or LLM_CACHE_DISK_MAX_ENTRIES
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()
+        self._db = open_disk_tier(db_path, (
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)",
+        ), "LLM response cache") if db_path else None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    @staticmethod
+    def make_key(model: str, system_instructions: str, prompt: str, params: dict) -> str:
+        """
+        Build the cache key for one LLM call.
+
+        Returns:
+            str: Hex SHA-256 digest of the call's inputs.
+        """
+        payload = json.dumps(
+            {"model": model, "system": system_instructions, "prompt": prompt, "params": params},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry[1]
+            if entry:
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT response, expires_at FROM llm_responses WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logging.warning(f'LLM response cache read failed: {e}')
+                    row = None
+                if row and row[1] > now:
+                    # Promote to the memory tier, keeping the original expiry
+                    self._remember(key, row[0], row[1])
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, response: str):
+        """Store a response in both tiers."""
+        if not response:
+            return
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO llm_responses (key, response, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                        (key, response, now, expires_at),
+                    )
+                    # Prune expired rows and cap the table size now and then
+                    if self._stats["stores"] % 100 == 0:
+                        delete_expired(self._db, "llm_responses", now)
+                        evict_by_count(self._db, "llm_responses", self.disk_max_entries, order_column="created_at")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f'LLM response cache write failed: {e}')
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        self._memory[key] = (expires_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_responses")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        return {
+            **self._stats,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_enabled": self._db is not None,
+        }
+
+
+# Shared by the LLMManagers that opt in to caching (None when disabled through config)
+llm_response_cache = LLMResponseCache(db_path=LLM_CACHE_DB_PATH or None) if LLM_CACHE_ENABLED else None
@@ -1,16 +1,21 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage  
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from config import GEMINI_API, LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS
+import asyncio
+import contextlib
 import logging
 import re 
 import json
 from config import ALLOWED_IMAGE_EXTENSIONS, ALLOWED_VIDEO_EXTENSIONS
-from typing import List, Union, Dict
+from typing import List, Union, Dict, Optional
+from Agents.conversation_context import ConversationContext
+from Agents.llm_client_registry import llm_client_registry
+from Agents.llm_response_cache import LLMResponseCache, llm_response_cache
+from Agents.instrumentation import timed
 
 class LLMManager:
-    def __init__(self, model=None, api_key=GEMINI_API, temperature=None, max_tokens=None, timeout=None):
+    def __init__(self, model=None, api_key=GEMINI_API, temperature=None, max_tokens=None, timeout=None, use_cache=False):
         self._model = model or LLM_MODEL
         self._api_key = api_key 
         self._temperature = temperature if temperature is not None else LLM_TEMPERATURE
@@ -20,54 +25,211 @@ class LLMManager:
         Always think step-by-step, reference clinical reasoning, and answer strictly in JSON if asked. 
         When diagnosing, cite visual features, propose differentials, and state confidence levels.""")
         
-        # Use proper message types and maintain conversation history
-        self.conversation_history: str = '' # Initialize as empty string to hold conversation history including  HumanMessage, AIMessage
+        # Conversation history lives in a ConversationContext owned by the caller (request or chat session),
+        # so this manager stays stateless and can be shared between concurrent users
         self.prompt = ChatPromptTemplate.from_messages([
             self.SYSTEM_INSTRUCTIONS,
             ("human", "{user_input}"),
 ]) 
 
-        try:
-            self.llm = ChatGoogleGenerativeAI(
-                model=self._model,
-                api_key=self._api_key,
-                temperature=self._temperature,
-                max_tokens=self._max_tokens,
-                timeout=self._timeout,
-                max_retries=2,
-            )
-        except Exception as e:
-            raise RuntimeError(f"Failed to initialize Gemini LLM: {e}")
+        # Opt-in response cache; only worth it for deterministic (temperature 0) calls
+        self.cache: Optional[LLMResponseCache] = llm_response_cache if use_cache else None
+
+        # Clients are shared process-wide per configuration (connection reuse + one concurrency cap)
+        self.llm = llm_client_registry.get_client(
+            model=self._model,
+            api_key=self._api_key,
+            temperature=self._temperature,
+            max_tokens=self._max_tokens,
+            timeout=self._timeout,
+        )
 
+    def _cache_key(self, messages) -> Optional[str]:
+        """Cache key for a call, or None when caching is off or the input is not plain text"""
+        if self.cache is None or not isinstance(messages, str):
+            return None
+        return self.cache.make_key(
+            self._model,
+            self.SYSTEM_INSTRUCTIONS.content,
+            messages,
+            {"temperature": self._temperature, "max_tokens": self._max_tokens},
+        )
+
+    @timed()
     def invoke_llm(self, messages:str):
         """Handle both new messages and conversation history"""
+        cache_key = self._cache_key(messages)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         try:
             chain = self.prompt | self.llm | StrOutputParser()
-            return chain.invoke({'user_input': messages})
+            with llm_client_registry.sync_slot():
+                response = chain.invoke({'user_input': messages})
         
         except Exception as e:
             logging.error(f'LLM invocation failed: {e}')
             raise RuntimeError(f'LLM invocation error: {e}')
 
-    def send_message_to_llm(self, user_prompt: str) -> str:
-        """Maintain full conversation context with proper message types"""
-        # Append user message
-        self.conversation_history += f"USER: {user_prompt}\n"
-        
+        if cache_key:
+            self.cache.set(cache_key, response)
+        return response
+
+    @timed()
+    async def ainvoke_llm(self, messages: str):
+        """Async counterpart of invoke_llm; awaits the chain without blocking the event loop"""
+        cache_key = self._cache_key(messages)
+        if cache_key:
+            # The cache's disk tier is SQLite; keep its reads and commits off the event loop
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                return cached
+
         try:
-            response = self.invoke_llm(self.conversation_history)
-            # Append and store assistant response
-            self.conversation_history += f"AI_RESPONSE :{response}\n"
+            chain = self.prompt | self.llm | StrOutputParser()
+            async with llm_client_registry.async_slot():
+                response = await chain.ainvoke({'user_input': messages})
+
+        except Exception as e:
+            logging.error(f'LLM invocation failed: {e}')
+            raise RuntimeError(f'LLM invocation error: {e}')
+
+        if cache_key:
+            await asyncio.to_thread(self.cache.set, cache_key, response)
+        return response
+
+    def send_message_to_llm(self, user_prompt: str, context: Optional[ConversationContext] = None) -> str:
+        """
+        Send a prompt along with the caller's conversation history and record the exchange.
+
+        Args:
+            user_prompt: The new user message.
+            context: History of the current request/session. A throwaway context is used when omitted,
+                making the call stateless.
+        """
+        context = context if context is not None else ConversationContext()
+        self._compact_context(context)
+
+        try:
+            response = self.invoke_llm(context.render(user_prompt))
+            # Only successful exchanges are stored
+            context.add_turn(user_prompt, response)
             return self.parse_response(response)
             
         except Exception as e:
             logging.error(f'Conversation failed: {e}')
-            # Remove last user message if failed
-            self.conversation_history = self.conversation_history.rsplit(f"USER: {user_prompt}\n", 1)[0]
             raise e
 
-    def describe_visuals(self, visual_url: str, mime_type: str) -> str:
-        """Handle visual analysis with proper message types"""
+    async def asend_message_to_llm(self, user_prompt: str, context: Optional[ConversationContext] = None) -> str:
+        """Async counterpart of send_message_to_llm"""
+        context = context if context is not None else ConversationContext()
+
+        async with context.lock:
+            await self._acompact_context(context)
+            try:
+                response = await self.ainvoke_llm(context.render(user_prompt))
+                context.add_turn(user_prompt, response)
+                return self.parse_response(response)
+
+            except Exception as e:
+                logging.error(f'Conversation failed: {e}')
+                raise e
+
+    @timed()
+    async def astream_message_to_llm(self, user_prompt: str, context: Optional[ConversationContext] = None):
+        """
+        Streaming counterpart of asend_message_to_llm.
+
+        Yields the response text chunk by chunk as the model produces it; the full exchange is
+        recorded in the context once the stream completes. Responses are not JSON-parsed.
+        """
+        context = context if context is not None else ConversationContext()
+
+        # Only snapshot the history under the session lock: a slow or vanished SSE client must not
+        # keep other requests of the same session waiting while chunks are yielded
+        async with context.lock:
+            await self._acompact_context(context)
+            messages = context.render(user_prompt)
+
+        cache_key = self._cache_key(messages)
+        cached = await asyncio.to_thread(self.cache.get, cache_key) if cache_key else None
+        if cached is not None:
+            yield cached
+            async with context.lock:
+                context.add_turn(user_prompt, cached)
+            return
+
+        # The concurrency slot only covers pulling chunks from the model: they are queued (the response
+        # is bounded by max_tokens) and yielded from the queue, so a slow SSE client never holds a slot
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                chain = self.prompt | self.llm | StrOutputParser()
+                async with llm_client_registry.async_slot():
+                    async for chunk in chain.astream({'user_input': messages}):
+                        queue.put_nowait(chunk)
+                queue.put_nowait(done)
+            except Exception as e:
+                queue.put_nowait(e)
+
+        producer = asyncio.create_task(pump())
+        chunks = []
+        try:
+            while (chunk := await queue.get()) is not done:
+                if isinstance(chunk, Exception):
+                    logging.error(f'LLM streaming failed: {chunk}')
+                    raise RuntimeError(f'LLM invocation error: {chunk}')
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # Client gone (generator closed or cancelled): stop pulling from the model
+            if not producer.done():
+                producer.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await producer
+
+        response = "".join(chunks)
+        async with context.lock:
+            context.add_turn(user_prompt, response)
+            await self._acompact_context(context)
+        if cache_key:
+            await asyncio.to_thread(self.cache.set, cache_key, response)
+
+    def _compact_context(self, context: ConversationContext):
+        """Fold the oldest turns into the rolling summary once the history exceeds its token budget."""
+        if not context.over_budget():
+            return
+        summarized_turns = len(context.turns_to_summarize())
+        if not summarized_turns:
+            context.enforce_budget()
+            return
+        try:
+            context.apply_summary(self.invoke_llm(context.summary_prompt()), summarized_turns)
+        except Exception as e:
+            logging.warning(f'Context summarization failed, dropping oldest turns instead: {e}')
+            context.enforce_budget()
+
+    async def _acompact_context(self, context: ConversationContext):
+        """Async counterpart of _compact_context"""
+        if not context.over_budget():
+            return
+        summarized_turns = len(context.turns_to_summarize())
+        if not summarized_turns:
+            context.enforce_budget()
+            return
+        try:
+            context.apply_summary(await self.ainvoke_llm(context.summary_prompt()), summarized_turns)
+        except Exception as e:
+            logging.warning(f'Context summarization failed, dropping oldest turns instead: {e}')
+            context.enforce_budget()
+
+    @staticmethod
+    def _visual_content(visual_url: str, mime_type: str) -> list:
+        """Build the multimodal message content shared by describe_visuals and adescribe_visuals"""
         prompt = (
             "Analyze the visuals (i.e., image/video) provided as a board-certified dermatologist. "
             "1) List **all** observable skin features under these headings: Color, Morphology, Surface Changes, Texture, Distribution, Hair/Nails, Secondary Signs.  "
@@ -76,15 +238,28 @@ class LLMManager:
             "Format your answer as a Markdown bullet list."
         )
         
-        content = [
+        part_type = "image_url" if mime_type.startswith("image/") else "video_url"
+        return [
             {"type": "text", "text": prompt},
-            {"type": "image_url" if mime_type in ALLOWED_IMAGE_EXTENSIONS else "video_url", 
-             "image_url" if mime_type in ALLOWED_IMAGE_EXTENSIONS else "video_url": visual_url}
+            {"type": part_type, part_type: visual_url}
         ]
-        
+
+    @timed()
+    def describe_visuals(self, visual_url: str, mime_type: str) -> str:
+        """Handle visual analysis with proper message types"""
+        try:
+            response = self.invoke_llm([HumanMessage(content=self._visual_content(visual_url, mime_type))])
+            return response
+        except Exception as e:
+            logging.error(f'Visual analysis failed: {e}')
+            return f"Error analyzing visuals: {str(e)}"
+
+    @timed()
+    async def adescribe_visuals(self, visual_url: str, mime_type: str) -> str:
+        """Async counterpart of describe_visuals"""
         try:
-            response = self.invoke_llm([HumanMessage(content=content)])
-            return response.content
+            response = await self.ainvoke_llm([HumanMessage(content=self._visual_content(visual_url, mime_type))])
+            return response
         except Exception as e:
             logging.error(f'Visual analysis failed: {e}')
             return f"Error analyzing visuals: {str(e)}"
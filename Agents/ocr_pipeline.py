@@ -0,0 +1,233 @@
+import io
+import os
+import time
+import logging
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_EXCEPTION
+from typing import List, Optional, Tuple
+from PIL import Image, ImageOps, ImageSequence
+from Agents.upload_handler import BufferReader
+from config import OCR_WORKERS, OCR_DOCUMENT_TIMEOUT, OCR_TILE_HEIGHT, OCR_MAX_PAGES, OCR_MAX_SKEW_DEGREES
+
+# Tesseract bindings (optional; image reports are unsupported without them)
+try:
+    import pytesseract
+    PYTESSERACT_AVAILABLE = True
+except ImportError:
+    PYTESSERACT_AVAILABLE = False
+
+# Scans narrower than this are upscaled before OCR (Tesseract prefers ~300 dpi text)
+MIN_OCR_WIDTH = 1200
+# Width of the thumbnail used to estimate skew
+DESKEW_SAMPLE_WIDTH = 600
+DESKEW_STEP_DEGREES = 0.5
+# How far (in rows) above a tile boundary we look for a blank gap to cut at
+TILE_CUT_SEARCH_ROWS = 200
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _worker_count() -> int:
+    return OCR_WORKERS or os.cpu_count() or 1
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_worker_count())
+        return _pool
+
+
+def _otsu_threshold(image: "Image.Image") -> int:
+    """Global binarization threshold maximizing between-class variance of the grayscale histogram."""
+    histogram = image.histogram()
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    sum_background, weight_background, best, threshold = 0.0, 0, -1.0, 127
+    for level, count in enumerate(histogram):
+        weight_background += count
+        if not weight_background:
+            continue
+        weight_foreground = total - weight_background
+        if not weight_foreground:
+            break
+        sum_background += level * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best:
+            best, threshold = variance, level
+    return threshold
+
+
+def _row_profile(image: "Image.Image") -> List[int]:
+    """Mean brightness of every row (horizontal projection profile), computed by PIL in C."""
+    return list(image.resize((1, image.height), Image.BOX).getdata())
+
+
+def _estimate_skew(binary: "Image.Image") -> float:
+    """
+    Skew angle (degrees) of a binarized page: the rotation whose projection profile has the
+    sharpest contrast between text lines and the gaps between them.
+    """
+    sample = binary
+    if binary.width > DESKEW_SAMPLE_WIDTH:
+        sample = binary.resize((DESKEW_SAMPLE_WIDTH, max(1, binary.height * DESKEW_SAMPLE_WIDTH // binary.width)), Image.BOX)
+    best_angle, best_score = 0.0, -1.0
+    steps = int(OCR_MAX_SKEW_DEGREES / DESKEW_STEP_DEGREES)
+    for step in range(-steps, steps + 1):
+        angle = step * DESKEW_STEP_DEGREES
+        profile = _row_profile(sample.rotate(angle, resample=Image.NEAREST, fillcolor=255))
+        score = sum((profile[i + 1] - profile[i]) ** 2 for i in range(len(profile) - 1))
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def preprocess_image(image: "Image.Image") -> "Image.Image":
+    """Grayscale, upscale small scans, stretch contrast, binarize (Otsu) and deskew one page."""
+    image = ImageOps.exif_transpose(image).convert("L")
+    if image.width < MIN_OCR_WIDTH:
+        scale = MIN_OCR_WIDTH / image.width
+        image = image.resize((MIN_OCR_WIDTH, int(image.height * scale)), Image.LANCZOS)
+    image = ImageOps.autocontrast(image, cutoff=1)
+    threshold = _otsu_threshold(image)
+    binary = image.point(lambda p: 255 if p > threshold else 0)
+    angle = _estimate_skew(binary)
+    if angle:
+        binary = binary.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+        binary = binary.point(lambda p: 255 if p > 127 else 0)
+    return binary
+
+
+def split_pages(image: "Image.Image") -> List["Image.Image"]:
+    """Every frame of a multi-page image (e.g. a scanned TIFF), capped at OCR_MAX_PAGES."""
+    pages = []
+    for frame in ImageSequence.Iterator(image):
+        pages.append(frame.copy())
+        if len(pages) >= OCR_MAX_PAGES:
+            logging.warning(f'OCR: document has more than {OCR_MAX_PAGES} pages, ignoring the rest')
+            break
+    return pages
+
+
+def tile_page(page: "Image.Image") -> List["Image.Image"]:
+    """Split a tall scan into horizontal tiles, cutting in blank gaps so no text line is split."""
+    if page.height <= OCR_TILE_HEIGHT:
+        return [page]
+    profile = _row_profile(page)
+    tiles, top = [], 0
+    while page.height - top > OCR_TILE_HEIGHT:
+        target = top + OCR_TILE_HEIGHT
+        window = range(max(top + 1, target - TILE_CUT_SEARCH_ROWS), target)
+        # Brightest row near the boundary = the emptiest gap between text lines
+        cut = max(window, key=lambda row: (profile[row], row))
+        tiles.append(page.crop((0, top, page.width, cut)))
+        top = cut
+    tiles.append(page.crop((0, top, page.width, page.height)))
+    return tiles
+
+
+def _to_png(image: "Image.Image") -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _prepare_page(page_png: bytes) -> List[bytes]:
+    """Worker task: preprocess one page and return its tiles as PNG bytes."""
+    page = preprocess_image(Image.open(io.BytesIO(page_png)))
+    return [_to_png(tile) for tile in tile_page(page)]
+
+
+@functools.lru_cache(maxsize=1)
+def _check_tesseract() -> str:
+    """Fail fast (in the calling process) when the Tesseract binary is missing."""
+    return str(pytesseract.get_tesseract_version())
+
+
+def _ocr_tile(tile_png: bytes, timeout: float) -> Optional[str]:
+    """Worker task: run Tesseract on one preprocessed tile (None if it ran out of time)."""
+    try:
+        return pytesseract.image_to_string(Image.open(io.BytesIO(tile_png)), timeout=max(1, int(timeout)))
+    except pytesseract.TesseractNotFoundError as e:
+        # Not picklable back to the parent as-is
+        raise RuntimeError(str(e))
+    except RuntimeError as e:
+        if "timeout" in str(e).lower():
+            return None
+        raise
+
+
+def ocr_image_bytes(file_bytes, time_budget: Optional[float] = None) -> Tuple[str, bool]:
+    """
+    OCR an image report: pages of multi-frame images are preprocessed and tiled, and tiles are
+    recognized concurrently in a process pool, all within one per-document time budget.
+
+    Args:
+        file_bytes (bytes-like): The image file (PNG, JPEG, TIFF, BMP, ...).
+        time_budget (float, optional): Seconds for the whole document (defaults to OCR_DOCUMENT_TIMEOUT).
+            Tiles not recognized in time are dropped.
+
+    Returns:
+        tuple: (recognized text with pages separated by blank lines, partial) where `partial` is
+            True when the budget ran out before every tile was recognized.
+
+    Raises:
+        pytesseract.TesseractNotFoundError: If the Tesseract binary is missing.
+    """
+    deadline = time.monotonic() + (time_budget or OCR_DOCUMENT_TIMEOUT)
+    _check_tesseract()
+    pages = [_to_png(page) for page in split_pages(Image.open(BufferReader(file_bytes)))]
+    partial = False
+
+    if _worker_count() < 2:
+        page_tiles = [_prepare_page(page) for page in pages]
+        texts = []
+        for tiles in page_tiles:
+            page_text = []
+            for tile in tiles:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logging.warning('OCR time budget exhausted, returning partial text')
+                    return "\n\n".join(texts + ["\n".join(page_text)]).strip(), True
+                tile_text = _ocr_tile(tile, remaining)
+                partial = partial or tile_text is None
+                page_text.append((tile_text or "").strip())
+            texts.append("\n".join(page_text))
+        return "\n\n".join(texts).strip(), partial
+
+    pool = _get_pool()
+    page_futures = [pool.submit(_prepare_page, page) for page in pages]
+    tile_futures = []  # (page index, future)
+    for index, future in enumerate(page_futures):
+        remaining = deadline - time.monotonic()
+        try:
+            tiles = future.result(timeout=max(0, remaining))
+        except FutureTimeoutError:
+            logging.warning('OCR time budget exhausted while preprocessing, returning partial text')
+            partial = True
+            break
+        for tile in tiles:
+            tile_futures.append((index, pool.submit(_ocr_tile, tile, deadline - time.monotonic())))
+
+    done, pending = wait([future for _, future in tile_futures], timeout=max(0, deadline - time.monotonic()),
+                         return_when=FIRST_EXCEPTION)
+    for future in pending:
+        future.cancel()
+    for future in page_futures:
+        future.cancel()
+    if pending:
+        logging.warning(f'OCR time budget exhausted, dropping {len(pending)} of {len(tile_futures)} tiles')
+        partial = True
+
+    texts = [[] for _ in pages]
+    for index, future in tile_futures:
+        if future in done:
+            tile_text = future.result()
+            partial = partial or tile_text is None
+            texts[index].append((tile_text or "").strip())
+    return "\n\n".join("\n".join(page) for page in texts if page).strip(), partial
@@ -0,0 +1,147 @@
+import re
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Mapping, Optional
+from Agents.sqlite_tier import open_db, AccessLog, evict_by_size
+from config import PAGE_CACHE_ENABLED, PAGE_CACHE_DB_PATH, PAGE_CACHE_MAX_BYTES, PAGE_CACHE_DEFAULT_TTL
+
+
+@dataclass
+class CachedPage:
+    url: str
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    expires_at: float
+
+    def is_fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+    def validators(self) -> dict:
+        """Request headers for a conditional GET."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """
+    Disk-backed cache of scraped pages keyed by URL.
+
+    Stores the zlib-compressed raw HTML together with the extracted main-content text and the
+    HTTP validators, so a fresh entry costs a single lookup and a stale one a conditional GET.
+    Total stored size is capped, evicting the least recently used pages first.
+    """
+
+    def __init__(self, db_path: str, max_bytes: Optional[int] = None, default_ttl: Optional[int] = None):
+        self.max_bytes = max_bytes or PAGE_CACHE_MAX_BYTES
+        self.default_ttl = default_ttl if default_ttl is not None else PAGE_CACHE_DEFAULT_TTL
+        self._lock = threading.Lock()
+        self._stats = {"fresh_hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0}
+        # LRU touches from reads, written in batch with the next store
+        self._access = AccessLog("pages", key_column="url")
+        self._db = open_db(db_path, (
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, html BLOB NOT NULL, text TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "expires_at REAL NOT NULL, size INTEGER NOT NULL, fetched_at REAL NOT NULL, last_access REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)",
+        ))
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """
+        Look up a page.
+
+        Returns:
+            CachedPage or None: The entry (fresh or stale) if present.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text, etag, last_modified, expires_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            # Reads never write: the access time is recorded in memory and flushed by the next store
+            self._access.touch(url)
+        page = CachedPage(url=url, text=row[0], etag=row[1], last_modified=row[2], expires_at=row[3])
+        if page.is_fresh():
+            self._stats["fresh_hits"] += 1
+        return page
+
+    def get_html(self, url: str) -> Optional[str]:
+        """Return the stored raw HTML of a page (e.g. to re-extract it with a different extractor)."""
+        with self._lock:
+            row = self._db.execute("SELECT html FROM pages WHERE url = ?", (url,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def put(self, url: str, html: str, text: str, headers: Mapping[str, str]):
+        """Store a freshly downloaded page, honoring Cache-Control: no-store."""
+        expires_at = self._expires_at(headers)
+        if expires_at is None or not text:
+            return
+        compressed = zlib.compress(html.encode('utf-8'), 6)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, html, text, etag, last_modified, expires_at, size, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, compressed, text, headers.get("etag"), headers.get("last-modified"), expires_at,
+                 len(compressed) + len(text.encode('utf-8')), now, now),
+            )
+            self._stats["stores"] += 1
+            self._access.flush(self._db)
+            self._stats["evictions"] += evict_by_size(self._db, "pages", self.max_bytes, key_column="url")
+            self._db.commit()
+
+    def refresh(self, url: str, headers: Mapping[str, str]):
+        """Extend a stale entry after the origin answered 304 Not Modified."""
+        self._stats["revalidated"] += 1
+        expires_at = self._expires_at(headers)
+        with self._lock:
+            if expires_at is None:
+                self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            else:
+                self._db.execute(
+                    "UPDATE pages SET expires_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                    (expires_at, headers.get("etag"), headers.get("last-modified"), url),
+                )
+            self._access.flush(self._db)
+            self._db.commit()
+
+    def _expires_at(self, headers: Mapping[str, str]) -> Optional[float]:
+        """Expiry timestamp from Cache-Control, None when the page must not be stored."""
+        cache_control = (headers.get("cache-control") or "").lower()
+        if "no-store" in cache_control:
+            return None
+        if "no-cache" in cache_control:
+            # Storable, but must be revalidated before every use
+            return time.time()
+        match = re.search(r"(?:s-maxage|max-age)\s*=\s*(\d+)", cache_control)
+        ttl = int(match.group(1)) if match else self.default_ttl
+        return time.time() + ttl
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        return {**self._stats, "entries": entries, "size_bytes": size, "max_bytes": self.max_bytes}
+
+
+def _open_page_cache() -> Optional[PageCache]:
+    if not PAGE_CACHE_ENABLED or not PAGE_CACHE_DB_PATH:
+        return None
+    try:
+        return PageCache(PAGE_CACHE_DB_PATH)
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f'Page cache disabled ({e})')
+        return None
+
+
+# Shared by the process-wide scraper (None when disabled or the cache directory is not writable)
+page_cache = _open_page_cache()
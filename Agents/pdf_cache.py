@@ -0,0 +1,136 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+from Agents.sqlite_tier import open_disk_tier, AccessLog, evict_by_size
+from config import PDF_CACHE_ENABLED, PDF_CACHE_MEMORY_MAX_BYTES, PDF_CACHE_DB_PATH, PDF_CACHE_DISK_MAX_BYTES
+
+
+class PdfCache:
+    """
+    Content-addressed cache of rendered report PDFs.
+
+    Keyed by a SHA-256 of the report markdown plus the render options, so the key doubles as a
+    (weak) ETag. Two tiers, both bounded by total size: an in-memory LRU for the reports being
+    previewed/downloaded right now, and an optional SQLite table that survives restarts.
+    """
+
+    def __init__(self, memory_max_bytes: Optional[int] = None, db_path: Optional[str] = None,
+                 disk_max_bytes: Optional[int] = None):
+        self.memory_max_bytes = memory_max_bytes or PDF_CACHE_MEMORY_MAX_BYTES
+        self.disk_max_bytes = disk_max_bytes or PDF_CACHE_DISK_MAX_BYTES
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        # Disk-hit LRU touches, written with the next store instead of committing on every read
+        self._access = AccessLog("pdf_artifacts")
+        self._db = open_disk_tier(db_path, (
+            "CREATE TABLE IF NOT EXISTS pdf_artifacts ("
+            "key TEXT PRIMARY KEY, pdf BLOB NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS pdf_artifacts_last_access ON pdf_artifacts (last_access)",
+        ), "PDF cache") if db_path else None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "not_modified": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(markdown_text: str, options: dict) -> str:
+        """
+        Build the cache key (and ETag value) of one render.
+
+        Returns:
+            str: Hex SHA-256 digest of the markdown and render options.
+        """
+        payload = json.dumps({"markdown": markdown_text, "options": options}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached PDF for `key`, or None on a miss."""
+        with self._lock:
+            pdf = self._memory.get(key)
+            if pdf is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return pdf
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT pdf FROM pdf_artifacts WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error as e:
+                    logging.warning(f'PDF cache read failed: {e}')
+                    row = None
+                if row:
+                    self._access.touch(key)
+                    self._remember(key, row[0])
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, pdf: bytes):
+        """Store a rendered PDF in both tiers."""
+        if not pdf:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, pdf)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO pdf_artifacts (key, pdf, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                        (key, pdf, len(pdf), now, now),
+                    )
+                    self._access.flush(self._db)
+                    self._stats["evictions"] += evict_by_size(self._db, "pdf_artifacts", self.disk_max_bytes)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f'PDF cache write failed: {e}')
+
+    def record_not_modified(self):
+        """Count a conditional request answered with 304."""
+        self._stats["not_modified"] += 1
+
+    def _remember(self, key: str, pdf: bytes):
+        if len(pdf) > self.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = pdf
+        self._memory_bytes += len(pdf)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._access.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM pdf_artifacts")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        disk_entries, disk_bytes = 0, 0
+        if self._db is not None:
+            with self._lock:
+                disk_entries, disk_bytes = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pdf_artifacts"
+                ).fetchone()
+        return {
+            **self._stats,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_enabled": self._db is not None,
+            "disk_entries": disk_entries,
+            "disk_bytes": disk_bytes,
+        }
+
+
+# Rendered report PDFs served by /generate_report_pdf (None when disabled through config)
+pdf_cache = PdfCache(db_path=PDF_CACHE_DB_PATH or None) if PDF_CACHE_ENABLED else None
@@ -0,0 +1,181 @@
+import io
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from markdown_pdf import MarkdownPdf, Section
+from config import PDF_RENDER_WORKERS
+from Agents.instrumentation import timed
+
+REPORT_TITLE = "Dermatology Diagnosis Report"
+REPORT_AUTHOR = "Derma AI "
+REPORT_TOC_LEVEL = 2
+
+# Everything besides the markdown that changes the rendered document (part of the PDF cache key)
+RENDER_OPTIONS = {"title": REPORT_TITLE, "author": REPORT_AUTHOR, "toc_level": REPORT_TOC_LEVEL, "optimize": True}
+
+_worker_ready = False
+
+
+def _init_worker():
+    """
+    Process-pool initializer: run a throwaway render so MuPDF's document writer, HTML story
+    engine and built-in fonts are loaded before the first real report reaches this worker.
+    """
+    global _worker_ready
+    if not _worker_ready:
+        _worker_ready = True
+        render_markdown_pdf("# warm-up\n\nDerma AI")
+
+
+def render_markdown_pdf(md_text: str, title: str = REPORT_TITLE, author: str = REPORT_AUTHOR) -> bytes:
+    """
+    Render report markdown to PDF bytes, entirely in memory.
+
+    Args:
+        md_text (str): Markdown text to convert.
+        title (str): PDF metadata title.
+        author (str): PDF metadata author.
+
+    Returns:
+        bytes: The PDF document.
+    """
+    pdf = MarkdownPdf(toc_level=REPORT_TOC_LEVEL, optimize=RENDER_OPTIONS["optimize"])
+    # Add markdown as a single section (no TOC for title)
+    pdf.add_section(Section(md_text, toc=False))
+    # MarkdownPdf.meta is a class attribute (with dates frozen at import time); give each document its own copy
+    now = time.strftime("D:%Y%m%d%H%M%S")
+    pdf.meta = {**MarkdownPdf.meta, "title": title, "author": author, "creationDate": now, "modDate": now}
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    return buffer.getvalue()
+
+
+class PdfRenderer:
+    """
+    Off-loop PDF rendering service.
+
+    MuPDF layout is CPU-bound and holds the GIL, so renders run in a process pool sized to the
+    available cores. Each worker preloads the converter once (see _init_worker) and then serves
+    any number of renders; results come back as bytes, so concurrent requests never share a file.
+    Hosts that cannot start worker processes (e.g. serverless runtimes without multiprocessing
+    support) fall back to rendering in a thread of the current process.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or PDF_RENDER_WORKERS or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_process = False
+        self._stats = {"renders": 0, "failures": 0, "render_seconds": 0.0, "pool_restarts": 0}
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        """The worker pool, or None once the renderer has fallen back to in-process rendering."""
+        with self._lock:
+            if self._pool is None and not self._in_process:
+                try:
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker)
+                except Exception as e:
+                    self._fall_back(e)
+            return self._pool
+
+    def _fall_back(self, error: BaseException):
+        # Called with self._lock held
+        logging.warning(f'PDF render pool unavailable ({error}), rendering in-process instead')
+        self._in_process = True
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _disable_pool(self, error: BaseException):
+        with self._lock:
+            self._fall_back(error)
+
+    def _reset_pool(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is broken:
+                self._pool = None
+                self._stats["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, pool: ProcessPoolExecutor, *args) -> Optional[Future]:
+        """Queue a render on the pool; None (and in-process mode) if its workers cannot be spawned."""
+        try:
+            return pool.submit(render_markdown_pdf, *args)
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            # Workers are spawned on demand, so a host without multiprocessing only fails here
+            self._disable_pool(e)
+            return None
+
+    def start(self):
+        """
+        Spawn the worker processes (each warms up in its initializer) ahead of the first request.
+        Never raises: if the pool cannot be started, renders run in-process from then on.
+        """
+        pool = self._get_pool()
+        if pool is None:
+            return
+        try:
+            for future in [pool.submit(_init_worker) for _ in range(self.max_workers)]:
+                future.result()
+        except Exception as e:
+            self._disable_pool(e)
+
+    @timed()
+    async def render(self, md_text: str, title: str = REPORT_TITLE, author: str = REPORT_AUTHOR) -> bytes:
+        """
+        Render markdown to PDF bytes in a worker process (or a thread, without a pool) without
+        blocking the event loop.
+
+        Raises:
+            RuntimeError: If the render failed.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                future = self._submit(pool, md_text, title, author) if pool is not None else None
+                if future is None:
+                    pdf_bytes = await loop.run_in_executor(None, render_markdown_pdf, md_text, title, author)
+                else:
+                    pdf_bytes = await asyncio.wrap_future(future)
+                break
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); start a fresh pool and retry once
+                logging.warning('PDF render pool broken, restarting it')
+                self._reset_pool(pool)
+                if attempt:
+                    self._stats["failures"] += 1
+                    raise RuntimeError("PDF rendering workers crashed")
+            except Exception as e:
+                self._stats["failures"] += 1
+                raise RuntimeError(f"PDF rendering failed: {e}") from e
+        self._stats["renders"] += 1
+        self._stats["render_seconds"] += time.perf_counter() - started
+        return pdf_bytes
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        renders = self._stats["renders"]
+        return {
+            **{key: value for key, value in self._stats.items() if key != "render_seconds"},
+            "workers": 0 if self._in_process else self.max_workers,
+            "in_process": self._in_process,
+            "avg_render_seconds": round(self._stats["render_seconds"] / renders, 4) if renders else None,
+        }
+
+
+# Shared rendering service used by the report endpoints
+pdf_renderer = PdfRenderer()
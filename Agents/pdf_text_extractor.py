@@ -0,0 +1,177 @@
+import os
+import logging
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from Agents.upload_handler import BufferReader
+from config import PDF_EXTRACTOR_ENGINE, PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_PAGES_PER_BATCH
+
+# Fast MuPDF-based extraction (optional; falls back to pure-Python PyPDF2)
+try:
+    import pymupdf as fitz
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    try:
+        import fitz  # PyMuPDF < 1.24.3
+        PYMUPDF_AVAILABLE = True
+    except ImportError:
+        PYMUPDF_AVAILABLE = False
+        print("⚠️ Warning: PyMuPDF not found. Falling back to the slower PyPDF2 for PDF text extraction.")
+        print("   Install it: pip install PyMuPDF")
+
+try:
+    import PyPDF2
+    PYPDF2_AVAILABLE = True
+except ImportError:
+    PYPDF2_AVAILABLE = False
+
+PAGE_SEPARATOR = "\n\n"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Worker-process state: (path, document) of the PDF the last batch came from, kept open for the next ones
+_worker_doc = None
+
+
+def _worker_count() -> int:
+    return PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_worker_count())
+        return _pool
+
+
+def _collect(pages, max_chars: Optional[int]) -> Tuple[List[str], int]:
+    """Gather non-empty page texts until the character budget is reached."""
+    parts, total = [], 0
+    for page_text in pages:
+        page_text = page_text.strip()
+        if not page_text:
+            continue
+        parts.append(page_text)
+        total += len(page_text) + len(PAGE_SEPARATOR)
+        if max_chars and total >= max_chars:
+            break
+    return parts, total
+
+
+def _pymupdf_page_texts(doc, start: int, stop: int):
+    for number in range(start, stop):
+        try:
+            yield doc.load_page(number).get_text()
+        except Exception as e:
+            logging.warning(f'PDF page {number + 1} could not be extracted: {e}')
+            yield ""
+
+
+def _open_worker_doc(path: str):
+    global _worker_doc
+    if _worker_doc is None or _worker_doc[0] != path:
+        if _worker_doc is not None:
+            _worker_doc[1].close()
+        _worker_doc = (path, fitz.open(path, filetype="pdf"))
+    return _worker_doc[1]
+
+
+def _extract_page_range(path: str, start: int, stop: int, max_chars: Optional[int]) -> List[str]:
+    """Worker task: texts of pages [start, stop) of the PDF at `path`, stopping early at the budget."""
+    return _collect(_pymupdf_page_texts(_open_worker_doc(path), start, stop), max_chars)[0]
+
+
+def extract_pdf_text_pymupdf(data: bytes, max_chars: Optional[int] = None, parallel: bool = True) -> str:
+    """
+    Extract PDF text with PyMuPDF, stopping once `max_chars` characters have been collected.
+
+    Large documents (PDF_PARALLEL_MIN_PAGES and up) are split into page batches extracted in a
+    process pool. Batches are submitted in a sliding window of one per worker and consumed in
+    page order, so pages past the character budget are never extracted. The document is written
+    once to a temp file that each worker opens on its first batch and keeps open for the following
+    ones, so batches only carry a path and a page range.
+    """
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        page_count = doc.page_count
+        workers = _worker_count()
+        if not parallel or workers < 2 or page_count < PDF_PARALLEL_MIN_PAGES:
+            parts, _ = _collect(_pymupdf_page_texts(doc, 0, page_count), max_chars)
+            return PAGE_SEPARATOR.join(parts)[:max_chars or None]
+
+    pool = _get_pool()
+    with tempfile.NamedTemporaryFile(prefix="pdf-extract-", suffix=".pdf") as spool:
+        spool.write(data)
+        spool.flush()
+        batches = [(start, min(start + PDF_PAGES_PER_BATCH, page_count)) for start in range(0, page_count, PDF_PAGES_PER_BATCH)]
+        pending = [pool.submit(_extract_page_range, spool.name, start, stop, max_chars) for start, stop in batches[:workers]]
+        next_batch, parts, total = workers, [], 0
+        try:
+            while pending:
+                batch_parts = pending.pop(0).result()
+                parts.extend(batch_parts)
+                total += sum(len(part) + len(PAGE_SEPARATOR) for part in batch_parts)
+                if max_chars and total >= max_chars:
+                    break
+                if next_batch < len(batches):
+                    start, stop = batches[next_batch]
+                    pending.append(pool.submit(_extract_page_range, spool.name, start, stop, max_chars))
+                    next_batch += 1
+        finally:
+            # Batches still running keep reading the file through their open handle after it is removed
+            for future in pending:
+                future.cancel()
+    return PAGE_SEPARATOR.join(parts)[:max_chars or None]
+
+
+def extract_pdf_text_pypdf2(data: bytes, max_chars: Optional[int] = None) -> str:
+    """Extract PDF text with PyPDF2 (the original implementation), stopping at the budget."""
+    reader = PyPDF2.PdfReader(BufferReader(data))
+
+    def page_texts():
+        for i, page in enumerate(reader.pages):
+            try:
+                yield page.extract_text() or ""
+            except Exception as page_e:
+                print(f"  ⚠️ Error extracting text from PDF page {i+1}: {page_e}")
+                yield ""
+
+    parts, _ = _collect(page_texts(), max_chars)
+    return PAGE_SEPARATOR.join(parts)[:max_chars or None]
+
+
+EXTRACTION_ENGINES = {
+    "pymupdf": extract_pdf_text_pymupdf,
+    "pypdf2": extract_pdf_text_pypdf2,
+}
+
+
+def extract_pdf_text(data, max_chars: Optional[int] = None, engine: Optional[str] = None, parallel: bool = True) -> str:
+    """
+    Extract the text of a PDF document.
+
+    Args:
+        data (bytes-like): The PDF file (bytes, or a memoryview over a spooled upload).
+        max_chars (int, optional): Character budget; extraction stops once it is reached.
+        engine (str, optional): "pymupdf" or "pypdf2" (defaults to PDF_EXTRACTOR_ENGINE; PyMuPDF
+            falls back to PyPDF2 when it is not installed or cannot open the file).
+        parallel (bool): Allow the process pool for large documents (PyMuPDF only).
+
+    Returns:
+        str: Page texts separated by blank lines, at most `max_chars` long.
+    """
+    engine = engine or PDF_EXTRACTOR_ENGINE
+    if engine not in EXTRACTION_ENGINES:
+        raise ValueError(f"Unknown PDF extraction engine: {engine}")
+    if engine == "pymupdf" and PYMUPDF_AVAILABLE:
+        try:
+            return extract_pdf_text_pymupdf(data, max_chars, parallel)
+        except Exception as e:
+            if not PYPDF2_AVAILABLE:
+                raise
+            logging.warning(f'PyMuPDF could not extract the PDF ({e}); retrying with PyPDF2')
+    if not PYPDF2_AVAILABLE:
+        raise RuntimeError("No PDF extraction library is installed (PyMuPDF or PyPDF2)")
+    return extract_pdf_text_pypdf2(data, max_chars)
@@ -1,9 +1,17 @@
 import os
 import base64
 import markdown as md
+import logging
 import tempfile
-from markdown_pdf import MarkdownPdf, Section
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from config import REPORT_IMAGE_LOOKUP_WORKERS
 from Agents.search_agent import SearchAgent
+from Agents.pdf_renderer import render_markdown_pdf
+from Agents.instrumentation import timed
+
+_image_lookup_pool = ThreadPoolExecutor(max_workers=REPORT_IMAGE_LOOKUP_WORKERS, thread_name_prefix="report-images")
 
 class ReportGeneratorAgent:
     """
@@ -12,7 +20,52 @@ class ReportGeneratorAgent:
     """
 
     @staticmethod
-    def generate_report_markdown(final_diagnose: dict) -> str:
+    @timed()
+    def disease_image_urls(disease: str) -> List[str]:
+        """
+        Image URLs for a disease. The name is normalized so that the search (memoized by
+        search_result_cache) is shared by every spelling of it, as disease names repeat heavily.
+
+        Raises:
+            RuntimeError: If the image search fails (failures are not cached).
+        """
+        return SearchAgent.imgs_url(SearchAgent.search_images(" ".join(disease.lower().split())))
+
+    @staticmethod
+    def _image_key(disease) -> str:
+        """Lookup key of a disease entry; LLM output may hold non-string entries."""
+        return str(disease).strip()
+
+    @staticmethod
+    @timed()
+    def lookup_report_images(diseases: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Run the image lookups of a whole report concurrently.
+
+        Args:
+            diseases (iterable): Disease names (duplicates are looked up once).
+
+        Returns:
+            dict: disease (as normalized by _image_key) -> image URLs (empty list when the lookup failed).
+        """
+        names = (ReportGeneratorAgent._image_key(d) for d in diseases if d)
+        futures = {
+            # Each lookup runs in a copy of the caller's context, so its stage timing reaches the request's breakdown
+            disease: _image_lookup_pool.submit(contextvars.copy_context().run, ReportGeneratorAgent.disease_image_urls, disease)
+            for disease in dict.fromkeys(name for name in names if name)
+        }
+        images = {}
+        for disease, future in futures.items():
+            try:
+                images[disease] = future.result()
+            except Exception as e:
+                logging.warning(f'Image lookup for "{disease}" failed: {e}')
+                images[disease] = []
+        return images
+
+    @staticmethod
+    @timed()
+    def generate_report_markdown(final_diagnose: dict, visual_description: Optional[str] = None) -> str:
         """
         Generate a comprehensive dermatological diagnosis report in Markdown format.
 
@@ -24,6 +77,7 @@ class ReportGeneratorAgent:
                 - treatment_and_recommendation (str): Treatment and recommendations.
                 - conclusion (str): Final conclusion.
                 - differential_diagnosis (dict): Alternative diagnoses with justifications.
+            visual_description (str, optional): Description of the submitted image, if any.
 
         Returns:
             str: Generated report in Markdown format.
@@ -35,16 +89,23 @@ class ReportGeneratorAgent:
         conclusion = final_diagnose.get("conclusion", "No conclusion provided.")
         differentials = final_diagnose.get("differential_diagnosis", {})
 
+        # Resolve every image of the report up front, in parallel, before writing any section
+        image_diseases = [disease] + [
+            alt_diag.get('disease', key) for key, alt_diag in differentials.items() if isinstance(alt_diag, dict)
+        ]
+        images = ReportGeneratorAgent.lookup_report_images(image_diseases)
+
         report_md = f"# Dermatological Diagnosis Report\n\n"
         report_md += "---\n\n"
         report_md += f"## Final Diagnosis: **{disease}**\n\n"
         report_md += "---\n\n"
+        if visual_description:
+            report_md += f"### Visual Findings:\n{visual_description}\n\n"
         report_md += f"### Justification:\n{justification}\n\n"
         report_md += f"### Possible Causes:\n{causes}\n\n"
 
         # Add relevant images for the primary disease
-        search_results = SearchAgent.search_images(disease)
-        image_urls = SearchAgent.imgs_url(search_results)
+        image_urls = images.get(ReportGeneratorAgent._image_key(disease))
         if image_urls:
             # Include only the first image for brevity
             for url in image_urls[0:1]:
@@ -65,8 +126,7 @@ class ReportGeneratorAgent:
 
             # Add images for differential diagnosis if available
             if isinstance(alt_diag, dict):
-                alt_search_results = SearchAgent.search_images(alt_disease)
-                alt_image_urls = SearchAgent.imgs_url(alt_search_results)
+                alt_image_urls = images.get(ReportGeneratorAgent._image_key(alt_disease))
                 if alt_image_urls:
                     for url in alt_image_urls[0:1]:
                         report_md += f"![{alt_disease}]({url})\n\n"
@@ -77,6 +137,22 @@ class ReportGeneratorAgent:
         return report_md
 
     @staticmethod
+    @timed()
+    def markdown_to_pdf_bytes(md_text: str) -> bytes:
+        """
+        Convert Markdown text to a styled PDF document in memory (in the calling process).
+        Request handlers should use `pdf_renderer.render`, which runs this off the event loop.
+
+        Args:
+            md_text (str): Markdown text to convert.
+
+        Returns:
+            bytes: The generated PDF.
+        """
+        return render_markdown_pdf(md_text)
+
+    @staticmethod
+    @timed()
     def markdown_to_pdf(md_text: str, filename: str = "dermatology_report.pdf") -> str:
         """
         Convert Markdown text to a styled PDF file using markdown-pdf library.
@@ -88,18 +164,6 @@ class ReportGeneratorAgent:
         Returns:
             str: Path to the generated PDF file.
         """
-        pdf = MarkdownPdf(toc_level=2, optimize=True)
-
-        # Add markdown as a single section (no TOC for title)
-        pdf.add_section(Section(md_text, toc=False))
-
-        # Optional: set metadata
-        pdf.meta["title"] = "Dermatology Diagnosis Report"
-        pdf.meta["author"] = "Derma AI "
-
-        # Save PDF to file
-        pdf.save(filename)
-
+        with open(filename, "wb") as f:
+            f.write(ReportGeneratorAgent.markdown_to_pdf_bytes(md_text))
         return filename
-
-    
\ No newline at end of file
@@ -0,0 +1,175 @@
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+from Agents.sqlite_tier import open_disk_tier, AccessLog, evict_by_size, evict_by_count, delete_expired
+from config import (REPORT_CACHE_ENABLED, REPORT_CACHE_DB_PATH, REPORT_TEXT_CACHE_MAX_BYTES,
+                    REPORT_ANALYSIS_CACHE_MAX_ENTRIES, REPORT_ANALYSIS_CACHE_TTL)
+
+
+class ReportResultCache:
+    """
+    Results of /analyze_report keyed by the SHA-256 of the uploaded file.
+
+    Two independent stores with their own eviction:
+    - extracted text (keyed by file hash + MIME type + extraction version): LRU bounded by total
+      size, no expiry, since extraction/OCR of the same bytes is deterministic;
+    - final analyses (keyed by file hash + analysis version, i.e. prompt and model): LRU bounded
+      by entry count, with a TTL so improved prompts/models roll out without a manual purge.
+    Each store has a memory tier and an optional SQLite tier that survives restarts.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, text_max_bytes: Optional[int] = None,
+                 analysis_max_entries: Optional[int] = None, analysis_ttl: Optional[int] = None):
+        self.text_max_bytes = text_max_bytes or REPORT_TEXT_CACHE_MAX_BYTES
+        self.analysis_max_entries = analysis_max_entries or REPORT_ANALYSIS_CACHE_MAX_ENTRIES
+        self.analysis_ttl = analysis_ttl or REPORT_ANALYSIS_CACHE_TTL
+        self._texts: "OrderedDict[str, str]" = OrderedDict()
+        self._texts_bytes = 0
+        self._analyses: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, analysis)
+        self._lock = threading.Lock()
+        # Disk-hit LRU touches per table, written with the next store instead of committing on every read
+        self._access = {table: AccessLog(table) for table in ("extracted_texts", "analyses")}
+        self._db = open_disk_tier(db_path, (
+            "CREATE TABLE IF NOT EXISTS extracted_texts ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "key TEXT PRIMARY KEY, analysis TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)",
+        ), "Report result cache") if db_path else None
+        self._stats = {
+            "text_hits": 0, "text_misses": 0, "text_evictions": 0,
+            "analysis_hits": 0, "analysis_misses": 0, "analysis_evictions": 0,
+        }
+
+    # --- Extracted text ---
+    def get_text(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+                self._stats["text_hits"] += 1
+                return text
+            row = self._db_get("SELECT text FROM extracted_texts WHERE key = ?", "extracted_texts", key)
+            if row:
+                self._remember_text(key, row[0])
+                self._stats["text_hits"] += 1
+                return row[0]
+            self._stats["text_misses"] += 1
+            return None
+
+    def set_text(self, key: str, text: str):
+        if not text:
+            return
+        with self._lock:
+            self._remember_text(key, text)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO extracted_texts (key, text, size, last_access) VALUES (?, ?, ?, ?)",
+                        (key, text, len(text.encode('utf-8')), time.time()),
+                    )
+                    self._access["extracted_texts"].flush(self._db)
+                    evict_by_size(self._db, "extracted_texts", self.text_max_bytes)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f'Report result cache write failed: {e}')
+
+    def _remember_text(self, key: str, text: str):
+        previous = self._texts.pop(key, None)
+        if previous is not None:
+            self._texts_bytes -= len(previous)
+        self._texts[key] = text
+        self._texts_bytes += len(text)
+        while self._texts_bytes > self.text_max_bytes and len(self._texts) > 1:
+            _, evicted = self._texts.popitem(last=False)
+            self._texts_bytes -= len(evicted)
+            self._stats["text_evictions"] += 1
+
+    # --- Final analyses ---
+    def get_analysis(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._analyses.get(key)
+            if entry and entry[0] > now:
+                self._analyses.move_to_end(key)
+                self._stats["analysis_hits"] += 1
+                return entry[1]
+            if entry:
+                del self._analyses[key]
+            row = self._db_get("SELECT analysis, expires_at FROM analyses WHERE key = ?", "analyses", key)
+            if row and row[1] > now:
+                self._remember_analysis(key, row[0], row[1])
+                self._stats["analysis_hits"] += 1
+                return row[0]
+            self._stats["analysis_misses"] += 1
+            return None
+
+    def set_analysis(self, key: str, analysis: str):
+        if not analysis:
+            return
+        now = time.time()
+        expires_at = now + self.analysis_ttl
+        with self._lock:
+            self._remember_analysis(key, analysis, expires_at)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO analyses (key, analysis, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                        (key, analysis, expires_at, now),
+                    )
+                    self._access["analyses"].flush(self._db)
+                    delete_expired(self._db, "analyses", now)
+                    evict_by_count(self._db, "analyses", self.analysis_max_entries)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f'Report result cache write failed: {e}')
+
+    def _remember_analysis(self, key: str, analysis: str, expires_at: float):
+        self._analyses[key] = (expires_at, analysis)
+        self._analyses.move_to_end(key)
+        while len(self._analyses) > self.analysis_max_entries:
+            self._analyses.popitem(last=False)
+            self._stats["analysis_evictions"] += 1
+
+    def _db_get(self, query: str, table: str, key: str):
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(query, (key,)).fetchone()
+            if row:
+                self._access[table].touch(key)
+            return row
+        except sqlite3.Error as e:
+            logging.warning(f'Report result cache read failed: {e}')
+            return None
+
+    def clear(self):
+        with self._lock:
+            for access in self._access.values():
+                access.clear()
+            self._texts.clear()
+            self._texts_bytes = 0
+            self._analyses.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM extracted_texts")
+                self._db.execute("DELETE FROM analyses")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        text_lookups = self._stats["text_hits"] + self._stats["text_misses"]
+        analysis_lookups = self._stats["analysis_hits"] + self._stats["analysis_misses"]
+        return {
+            **self._stats,
+            "text_hit_rate": round(self._stats["text_hits"] / text_lookups, 3) if text_lookups else 0.0,
+            "analysis_hit_rate": round(self._stats["analysis_hits"] / analysis_lookups, 3) if analysis_lookups else 0.0,
+            "text_entries": len(self._texts),
+            "text_bytes": self._texts_bytes,
+            "analysis_entries": len(self._analyses),
+            "disk_enabled": self._db is not None,
+        }
+
+
+# Shared by ReportingAnalysisAgent (None when disabled through config)
+report_result_cache = ReportResultCache(db_path=REPORT_CACHE_DB_PATH or None) if REPORT_CACHE_ENABLED else None
@@ -0,0 +1,144 @@
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+from config import (RETRIEVAL_INDEX_ENABLED, RETRIEVAL_INDEX_DB_PATH, RETRIEVAL_TOP_K, RETRIEVAL_MIN_HITS, RETRIEVAL_MIN_COVERAGE,
+                    RETRIEVAL_INDEX_MAX_DOCUMENTS, RETRIEVAL_INDEX_MAX_BYTES)
+from Agents.evidence_selector import chunk_text, tokenize
+from Agents.sqlite_tier import open_db
+
+
+class RetrievalIndex:
+    """
+    Persistent full-text index of previously scraped dermatology pages.
+
+    Pages are split into passages and stored in an SQLite FTS5 table (porter-stemmed, BM25-ranked).
+    Indexing is incremental: a page is only re-chunked when its text changed.
+    The index is capped by page count and total text size, evicting the pages indexed
+    (or seen again) least recently first.
+    """
+
+    def __init__(self, db_path: str, top_k: Optional[int] = None, max_documents: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        self.top_k = top_k or RETRIEVAL_TOP_K
+        self.max_documents = max_documents or RETRIEVAL_INDEX_MAX_DOCUMENTS
+        self.max_bytes = max_bytes or RETRIEVAL_INDEX_MAX_BYTES
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "sufficient": 0, "pages_indexed": 0, "evictions": 0}
+        self._db = open_db(db_path, (
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "url TEXT PRIMARY KEY, content_hash TEXT NOT NULL, indexed_at REAL NOT NULL, size INTEGER NOT NULL DEFAULT 0)",
+        ))
+        # Indexes created before the size cap have no size column (their pages count as 0 bytes)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(documents)")]
+        if "size" not in columns:
+            self._db.execute("ALTER TABLE documents ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_indexed_at ON documents (indexed_at)")
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(text, url UNINDEXED, tokenize = 'porter unicode61')"
+        )
+        self._db.commit()
+
+    def add_document(self, url: str, text: str) -> bool:
+        """
+        Index (or re-index) one page.
+
+        Returns:
+            bool: True if the index changed, False if the page was already indexed with the same text.
+        """
+        if not url or not text:
+            return False
+        content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        passages = chunk_text(text)
+        with self._lock:
+            row = self._db.execute("SELECT content_hash FROM documents WHERE url = ?", (url,)).fetchone()
+            if row and row[0] == content_hash:
+                # Seen again: keep it away from the eviction end
+                self._db.execute("UPDATE documents SET indexed_at = ? WHERE url = ?", (time.time(), url))
+                self._db.commit()
+                return False
+            self._db.execute("DELETE FROM passages WHERE url = ?", (url,))
+            self._db.executemany("INSERT INTO passages (text, url) VALUES (?, ?)", [(p, url) for p in passages])
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (url, content_hash, indexed_at, size) VALUES (?, ?, ?, ?)",
+                (url, content_hash, time.time(), len(text.encode('utf-8'))),
+            )
+            self._evict()
+            self._db.commit()
+            self._stats["pages_indexed"] += 1
+        return True
+
+    def _evict(self):
+        """Drop the least recently indexed pages (and their passages) until both caps are met."""
+        count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents").fetchone()
+        while count > self.max_documents or total > self.max_bytes:
+            row = self._db.execute("SELECT url, size FROM documents ORDER BY indexed_at ASC LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._db.execute("DELETE FROM passages WHERE url = ?", (row[0],))
+            self._db.execute("DELETE FROM documents WHERE url = ?", (row[0],))
+            count, total = count - 1, total - row[1]
+            self._stats["evictions"] += 1
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Dict]:
+        """
+        Top-k passages for a query.
+
+        Returns:
+            list: {"url", "text", "score"} dicts, best first (higher score is better).
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+        with self._lock:
+            self._stats["queries"] += 1
+            try:
+                rows = self._db.execute(
+                    "SELECT url, text, bm25(passages) AS rank FROM passages WHERE passages MATCH ? ORDER BY rank LIMIT ?",
+                    (match, k or self.top_k),
+                ).fetchall()
+            except sqlite3.Error as e:
+                logging.warning(f'Retrieval index query failed: {e}')
+                return []
+        return [{"url": url, "text": text, "score": round(-rank, 3)} for url, text, rank in rows]
+
+    def is_sufficient(self, query: str, hits: List[Dict]) -> bool:
+        """
+        Whether the retrieved passages cover the query well enough to skip a live web search:
+        at least RETRIEVAL_MIN_HITS passages, and at least RETRIEVAL_MIN_COVERAGE of the query terms
+        found in them (prefix match, to tolerate inflections like itchy/itching).
+        """
+        terms = set(tokenize(query))
+        if len(hits) < RETRIEVAL_MIN_HITS or not terms:
+            return False
+        hit_tokens = set(token for hit in hits for token in tokenize(hit["text"]))
+        prefixes = {token[:5] for token in hit_tokens}
+        covered = sum(1 for term in terms if term in hit_tokens or term[:5] in prefixes)
+        sufficient = covered / len(terms) >= RETRIEVAL_MIN_COVERAGE
+        if sufficient:
+            self._stats["sufficient"] += 1
+        return sufficient
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents").fetchone()
+        return {**self._stats, "documents": documents, "size_bytes": size,
+                "max_documents": self.max_documents, "max_bytes": self.max_bytes}
+
+
+def _open_retrieval_index() -> Optional[RetrievalIndex]:
+    if not RETRIEVAL_INDEX_ENABLED or not RETRIEVAL_INDEX_DB_PATH:
+        return None
+    try:
+        return RetrievalIndex(RETRIEVAL_INDEX_DB_PATH)
+    except (sqlite3.Error, OSError) as e:
+        # e.g. read-only filesystem or SQLite built without FTS5
+        logging.warning(f'Retrieval index disabled ({e})')
+        return None
+
+
+# Shared index fed by every scrape and queried by the chatbot (None when disabled)
+retrieval_index = _open_retrieval_index()
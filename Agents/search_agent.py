@@ -1,20 +1,30 @@
+import asyncio
 import requests
-from bs4 import BeautifulSoup
 from config import GOOGLE_API_KEY, IMAGE_ENGINE_ID, SEARCH_ENGINE_ID
 from Agents.llms_manager_agent import LLMManager
+from config import SEARCH_SUMMARY_CONCURRENCY
+from Agents.web_scraper import web_scraper
+from Agents.search_cache import search_result_cache
+from Agents.retrieval_index import retrieval_index
+from Agents.instrumentation import timed
 
 class SearchAgent:
     """
     A class to perform Google Custom Search for images and articles,
     extract URLs from search results, and scrape article contents.
     """
-    def __init__(self):
+    def __init__(self, llm_manager=None, use_llm_cache=True):
         """
         Initialize the SearchAgent.
-        This class does not require any specific initialization parameters.
+
+        Args:
+            llm_manager (LLMManager, optional): Manager to reuse for summaries. A new one
+                (backed by the shared client registry) is created when omitted.
+            use_llm_cache (bool): Cache article summaries in the shared LLM response cache.
         """
-        self.llm_manager = LLMManager()
+        self.llm_manager = llm_manager or LLMManager(use_cache=use_llm_cache)
     @staticmethod
+    @timed()
     def search_images(query):
         """
         Search for images related to 'skin affected by {query}' using Google Custom Search API.
@@ -24,6 +34,7 @@ class SearchAgent:
 
         Returns:
             dict: JSON response from the Google Custom Search API containing image search results.
+                Responses are cached and identical concurrent queries share one request.
 
         Raises:
             RuntimeError: If the API request fails or returns an error.
@@ -40,12 +51,15 @@ class SearchAgent:
                           "(KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
             "Referer": "https://www.google.com/"
         }
-        try:
-            res = requests.get(url, params=params, headers=headers, timeout=10)
-            res.raise_for_status()
-            return res.json()
-        except requests.RequestException as e:
-            raise RuntimeError(f'Image search error: {e}')
+        def fetch():
+            try:
+                res = requests.get(url, params=params, headers=headers, timeout=10)
+                res.raise_for_status()
+                return res.json()
+            except requests.RequestException as e:
+                raise RuntimeError(f'Image search error: {e}')
+
+        return search_result_cache.get_or_fetch((params['q'], IMAGE_ENGINE_ID, 'image', None), fetch)
 
     @staticmethod
     def imgs_url(search_result, top_k=3):
@@ -72,6 +86,7 @@ class SearchAgent:
             return []
 
     @staticmethod
+    @timed()
     def search_articles(query,max_results=5):
         """
         Search for articles related to '{query} : Causes & Symptoms' using Google Custom Search API.
@@ -81,6 +96,7 @@ class SearchAgent:
 
         Returns:
             dict: JSON response from the Google Custom Search API containing article search results.
+                Responses are cached and identical concurrent queries share one request.
 
         Raises:
             RuntimeError: If the API request fails or returns an error.
@@ -92,12 +108,15 @@ class SearchAgent:
             'cx': SEARCH_ENGINE_ID,
             'num': max_results
         }
-        try:
-            res = requests.get(url, params=params, timeout=10)
-            res.raise_for_status()
-            return res.json()
-        except requests.RequestException as e:
-            raise RuntimeError(f'Article search error: {e}')
+        def fetch():
+            try:
+                res = requests.get(url, params=params, timeout=10)
+                res.raise_for_status()
+                return res.json()
+            except requests.RequestException as e:
+                raise RuntimeError(f'Article search error: {e}')
+
+        return search_result_cache.get_or_fetch((params['q'], SEARCH_ENGINE_ID, 'web', max_results), fetch)
 
     @staticmethod
     def articles_url(search_results, max_urls=5):
@@ -125,49 +144,65 @@ class SearchAgent:
                     links_with_metadata.append(link_data)
         return links_with_metadata
     @staticmethod
+    @timed()
     def scrapper(links):
         """
         Scrape main textual content from a list of article URLs.
+        Thin blocking wrapper over the shared concurrent scraper.
 
         Args:
             links (list): List of URLs (strings) to scrape.
 
         Returns:
-            list: List of strings containing the scraped textual content from each URL.
+            list: List of strings containing the scraped textual content from each URL,
+                in the order of `links` (URLs that fail are skipped).
         """
-        headers = {
-            "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/118.0"
-        }
-        cookies = {"CONSENT": "YES+cb.20220419-08-p0.cs+FX+111"}
-        contents = []
-        for link in links:
-            try:
-                response = requests.get(link, headers=headers, cookies=cookies, timeout=10)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    main_content = (
-                        soup.find('main') or
-                        soup.find('article') or
-                        soup.find('div', class_='content') or
-                        soup.find('div', class_='page-content') or
-                        soup.find('div', id='main-content')
-                    )
-                    if main_content:
-                        text = main_content.get_text(separator=' ', strip=True)
-                    else:
-                        body = soup.find('body')
-                        text = body.get_text(separator=' ', strip=True) if body else ''
-                    if text:
-                        contents.append(text)
-            except requests.RequestException:
-                # Skip URLs that cause request errors or timeouts
-                continue
-            except Exception:
-                # Skip URLs that cause parsing errors or other exceptions
-                continue
-        return contents
+        texts = web_scraper.fetch_texts(links)
+        SearchAgent._index_pages(links, texts)
+        return [text for text in texts if text]
+
+    @staticmethod
+    @timed()
+    async def ascrapper(links):
+        """
+        Async counterpart of scrapper; fetches all links concurrently over pooled connections.
+
+        Args:
+            links (list): List of URLs (strings) to scrape.
+
+        Returns:
+            list: Scraped texts in the order of `links` (URLs that fail are skipped).
+        """
+        return [text for text in await SearchAgent.afetch_pages(links) if text]
     
-    def deepsearch(self, query, ,max_results=5):
+    @staticmethod
+    async def afetch_pages(links):
+        """
+        Scrape a list of URLs concurrently, keeping failures in place.
+
+        Args:
+            links (list): List of URLs (strings) to scrape.
+
+        Returns:
+            list: One entry per link, in order: the scraped text, or None if the page failed.
+        """
+        texts = await web_scraper.afetch_texts(links)
+        await asyncio.to_thread(SearchAgent._index_pages, links, texts)
+        return texts
+
+    @staticmethod
+    def _index_pages(links, texts):
+        """Feed scraped pages to the local retrieval index used by the chatbot."""
+        if retrieval_index is None:
+            return
+        for link, text in zip(links, texts):
+            if text:
+                try:
+                    retrieval_index.add_document(link, text)
+                except Exception as e:
+                    print(f"⚠️ Could not index {link}: {e}")
+
+    def deepsearch(self, query, max_results=5):
         """
         Perform a deep search for articles related to the query.
 
@@ -182,9 +217,25 @@ class SearchAgent:
         urls=[urlmd['url'] for urlmd in urls_with_metadata]
         bodies = self.scrapper(urls)
         return bodies
+
+    async def adeepsearch(self, query, max_results=5):
+        """
+        Async counterpart of deepsearch.
+
+        Args:
+            query (str): The search query term.
+
+        Returns:
+            list: List of strings containing the main textual content from the articles.
+        """
+        articles = await asyncio.to_thread(self.search_articles, query, max_results)
+        urls_with_metadata = self.articles_url(articles, max_results)
+        urls=[urlmd['url'] for urlmd in urls_with_metadata]
+        return await self.ascrapper(urls)
     
     # function to summazrize articles
-    def summarize_article(self, article_metadata: dict, query:str) ->str:
+    @timed()
+    async def summarize_article(self, article_metadata: dict, query:str) ->str:
         """
         Summarizes the content of an article using the LLM.
 
@@ -203,7 +254,7 @@ class SearchAgent:
         Title = article_metadata.get('title', 'No Title')
         Snippet = article_metadata.get('snippet', Title)
         URL = article_metadata.get('url', 'No URL')
-        article_content = self.scrapper([URL])
+        article_content = await self.ascrapper([URL])
         if not article_content:
             raise ValueError("No content scraped from the provided URL")
         # Join the scraped content into a single string
@@ -250,6 +301,37 @@ class SearchAgent:
         """
 
         # Send the prompt to the LLM and get the response
-        summary = self.llm_manager.send_message_to_llm(prompt)
+        summary = await self.llm_manager.asend_message_to_llm(prompt)
         
         return summary
+
+    async def summarize_articles(self, articles_metadata: list, query: str, concurrency: int = None):
+        """
+        Scrape and summarize several articles concurrently, yielding each one as soon as it is ready.
+
+        Args:
+            articles_metadata: List of article metadata dicts (title, snippet, url).
+            query: Research focus passed to summarize_article.
+            concurrency: Maximum number of articles processed at once.
+
+        Yields:
+            tuple: (index, article_metadata, summary, error) in completion order; `error` is None on
+                success and `summary` is None on failure.
+        """
+        slots = asyncio.Semaphore(concurrency or SEARCH_SUMMARY_CONCURRENCY)
+
+        async def summarize(index, article_metadata):
+            async with slots:
+                try:
+                    return index, article_metadata, await self.summarize_article(article_metadata, query), None
+                except Exception as e:
+                    return index, article_metadata, None, str(e) or e.__class__.__name__
+
+        tasks = [asyncio.ensure_future(summarize(i, md)) for i, md in enumerate(articles_metadata)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away or the consumer stopped early: don't keep summarizing
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,91 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+from config import SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES
+
+
+class SearchResultCache:
+    """
+    Thread-safe TTL cache with single-flight coalescing.
+
+    While a key is being fetched, concurrent callers asking for the same key wait for that
+    one upstream request instead of issuing their own. Failed fetches are not cached.
+    """
+
+    def __init__(self, ttl_seconds: Optional[int] = None, max_entries: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or SEARCH_CACHE_TTL
+        self.max_entries = max_entries or SEARCH_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "upstream_calls": 0, "upstream_errors": 0}
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for `key`, calling `fetch()` at most once across concurrent callers on a miss.
+
+        Args:
+            key: Hashable cache key.
+            fetch: Zero-argument callable performing the upstream request.
+
+        Returns:
+            The cached or freshly fetched value.
+
+        Raises:
+            Whatever `fetch` raised (propagated to every coalesced caller).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                future = self._in_flight[key] = Future()
+                self._stats["misses"] += 1
+                self._stats["upstream_calls"] += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                self._stats["upstream_errors"] += 1
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            del self._in_flight[key]
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            # Upstream requests avoided thanks to the cache and coalescing
+            "quota_saved": self._stats["hits"] + self._stats["coalesced"],
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+        }
+
+
+# Google Custom Search responses, keyed by (query, engine id, search type, num)
+search_result_cache = SearchResultCache()
@@ -0,0 +1,101 @@
+import os
+import time
+import sqlite3
+import logging
+from typing import Dict, Iterable, Optional
+
+
+def open_db(db_path: str, schema: Iterable[str] = ()) -> sqlite3.Connection:
+    """
+    Open a WAL-mode SQLite connection usable from any thread (callers serialize access with
+    their own lock), creating its directory and running the `schema` statements.
+
+    Raises:
+        sqlite3.Error, OSError: If the database cannot be created or opened.
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(db_path, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    for statement in schema:
+        db.execute(statement)
+    db.commit()
+    return db
+
+
+def open_disk_tier(db_path: str, schema: Iterable[str], name: str) -> Optional[sqlite3.Connection]:
+    """open_db for an optional disk tier: None (and a warning) when it cannot be opened."""
+    try:
+        return open_db(db_path, schema)
+    except (sqlite3.Error, OSError) as e:
+        # Read-only deployments (e.g. serverless) still get the memory tier
+        logging.warning(f'{name}: disk tier disabled ({e})')
+        return None
+
+
+class AccessLog:
+    """
+    LRU touches of one table's rows, recorded by reads and written in one batch by the next
+    write, so reads never write or commit. Not thread-safe: use it under the cache's lock.
+    """
+
+    def __init__(self, table: str, key_column: str = "key"):
+        self.table = table
+        self.key_column = key_column
+        self._pending: Dict[str, float] = {}
+
+    def touch(self, key: str):
+        self._pending[key] = time.time()
+
+    def flush(self, db: sqlite3.Connection):
+        """Write the pending touches (inside the caller's transaction, before it evicts)."""
+        if self._pending:
+            db.executemany(
+                f"UPDATE {self.table} SET last_access = ? WHERE {self.key_column} = ?",
+                [(accessed, key) for key, accessed in self._pending.items()],
+            )
+            self._pending.clear()
+
+    def clear(self):
+        self._pending.clear()
+
+
+def evict_by_size(db: sqlite3.Connection, table: str, max_bytes: int, key_column: str = "key") -> int:
+    """
+    Delete least recently accessed rows until the `size` column sums to at most `max_bytes`.
+
+    Returns:
+        int: Number of rows deleted.
+    """
+    excess = db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0] - max_bytes
+    if excess <= 0:
+        return 0
+    victims = []
+    for key, size in db.execute(f"SELECT {key_column}, size FROM {table} ORDER BY last_access ASC"):
+        victims.append((key,))
+        excess -= size
+        if excess <= 0:
+            break
+    db.executemany(f"DELETE FROM {table} WHERE {key_column} = ?", victims)
+    return len(victims)
+
+
+def evict_by_count(db: sqlite3.Connection, table: str, max_entries: int, order_column: str = "last_access",
+                   key_column: str = "key") -> int:
+    """
+    Keep the `max_entries` rows with the highest `order_column` and delete the rest.
+
+    Returns:
+        int: Number of rows deleted.
+    """
+    return db.execute(
+        f"DELETE FROM {table} WHERE {key_column} NOT IN "
+        f"(SELECT {key_column} FROM {table} ORDER BY {order_column} DESC LIMIT ?)",
+        (max_entries,),
+    ).rowcount
+
+
+def delete_expired(db: sqlite3.Connection, table: str, now: Optional[float] = None) -> int:
+    """Delete the rows whose `expires_at` has passed. Returns the number deleted."""
+    return db.execute(f"DELETE FROM {table} WHERE expires_at <= ?", (now or time.time(),)).rowcount
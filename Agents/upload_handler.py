@@ -0,0 +1,203 @@
+import io
+import mmap
+import shutil
+import hashlib
+import tempfile
+import mimetypes
+from typing import Iterable, Optional
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from config import UPLOAD_MAX_BYTES, UPLOAD_CHUNK_BYTES
+
+# Starlette spools multipart files in memory up to this size, then rolls them over to a temp file
+SPOOL_MEMORY_BYTES = 1024 * 1024
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_bytes // 1024 // 1024}MB.")
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only stream over a bytes-like buffer (e.g. a memory-mapped upload), without copying it."""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = max(0, min(len(target), len(self._view) - self._position))
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+class SpooledUpload:
+    """
+    An uploaded file that has been size-checked and SHA-256 hashed by spool_upload and left in
+    Starlette's spooled temp file. `buffer()` exposes the content: memory-mapped once the upload
+    has rolled over to disk, otherwise the bytes kept from the hashing pass (a copy of at most
+    SPOOL_MEMORY_BYTES).
+    """
+
+    def __init__(self, upload: UploadFile, mime_type: Optional[str], size: int, sha256: str,
+                 content: Optional[bytes] = None):
+        self.upload = upload
+        self.filename = upload.filename
+        self.mime_type = mime_type
+        self.size = size
+        self.sha256 = sha256
+        self._mmap: Optional[mmap.mmap] = None
+        self._bytes: Optional[bytes] = content
+
+    def buffer(self) -> memoryview:
+        """Read-only view of the whole file."""
+        if self.size > SPOOL_MEMORY_BYTES:
+            if self._mmap is None:
+                self._mmap = mmap.mmap(self.upload.file.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(self._mmap)
+        if self._bytes is None:
+            self.upload.file.seek(0)
+            self._bytes = self.upload.file.read()
+        return memoryview(self._bytes)
+
+    def stream(self) -> io.RawIOBase:
+        """Fresh seekable stream over the file (independent position)."""
+        return BufferReader(self.buffer())
+
+    async def detach(self):
+        """
+        Copy the file into a spool owned by this object, so it outlives the request
+        (FastAPI closes request uploads once the response is sent, e.g. for queued jobs).
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+
+        def copy():
+            self.upload.file.seek(0)
+            shutil.copyfileobj(self.upload.file, spool, UPLOAD_CHUNK_BYTES)
+            spool.seek(0)
+
+        await run_in_threadpool(copy)
+        original = self.upload
+        self.upload = UploadFile(file=spool, size=self.size, filename=original.filename, headers=original.headers)
+        await original.close()
+
+    async def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A view is still referenced somewhere; the map is released with it
+                pass
+            self._mmap = None
+        self._bytes = None
+        await self.upload.close()
+
+
+async def spool_upload(upload: UploadFile, max_bytes: Optional[int] = None) -> SpooledUpload:
+    """
+    Size-check, hash and type an upload that Starlette has already spooled.
+
+    Uploads take two passes, not one: Starlette's multipart parser spools the body (the byte
+    limit is enforced there, by UploadSizeLimitMiddleware), then this function reads the spool
+    again in one worker thread to hash it. Hashing on the way in would mean parsing multipart in
+    the middleware. The cost is one extra sequential read of the file (memory up to
+    SPOOL_MEMORY_BYTES, the temp file above that), plus a copy of small uploads, which are kept
+    so `buffer()` does not read them a third time. Files over the limit still get a 413 as soon
+    as it is crossed.
+
+    Args:
+        upload: The FastAPI upload.
+        max_bytes: Size limit (defaults to UPLOAD_MAX_BYTES).
+
+    Returns:
+        SpooledUpload: The checked upload; its content stays in the spooled temp file.
+
+    Raises:
+        HTTPException: 413 if the file is larger than the limit.
+    """
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    if upload.size is not None and upload.size > max_bytes:
+        await upload.close()
+        raise _too_large(max_bytes)
+
+    def read_through():
+        digest, size, chunks = hashlib.sha256(), 0, []
+        upload.file.seek(0)
+        while True:
+            chunk = upload.file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                return None
+            digest.update(chunk)
+            if size <= SPOOL_MEMORY_BYTES:
+                chunks.append(chunk)
+        upload.file.seek(0)
+        return size, digest.hexdigest(), b"".join(chunks) if size <= SPOOL_MEMORY_BYTES else None
+
+    result = await run_in_threadpool(read_through)
+    if result is None:
+        await upload.close()
+        raise _too_large(max_bytes)
+    size, sha256, content = result
+
+    mime_type = upload.content_type
+    if not mime_type or mime_type == 'application/octet-stream':
+        mime_type, _ = mimetypes.guess_type(upload.filename or "")
+        print(f"Guessed MIME type as: {mime_type} for file {upload.filename}")
+    return SpooledUpload(upload, mime_type, size, sha256, content)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware rejecting oversized upload bodies before they are buffered: 413 right away
+    when Content-Length is over the limit, otherwise the body stream is counted and the request
+    is aborted with 413 as soon as it crosses the limit (chunked uploads).
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_bytes: Optional[int] = None):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes or UPLOAD_MAX_BYTES
+        # Room for the multipart boundaries and the other form fields
+        self.body_limit = self.max_bytes + 64 * 1024
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.body_limit:
+            response = JSONResponse({"detail": _too_large(self.max_bytes).detail}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.body_limit:
+                    # Re-raised by FastAPI's body parsing and rendered as a 413 response
+                    raise _too_large(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
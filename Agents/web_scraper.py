@@ -0,0 +1,296 @@
+import time
+import codecs
+import asyncio
+import contextlib
+import logging
+import threading
+from collections import Counter, deque
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+import httpx
+from config import (SCRAPER_MAX_CONCURRENCY, SCRAPER_PER_HOST_LIMIT, SCRAPER_TIMEOUT, SCRAPER_DEADLINE,
+                    SCRAPER_MAX_BYTES, SCRAPER_MAX_TEXT_CHARS, HTML_EXTRACTOR_ENGINE)
+from Agents.page_cache import PageCache, page_cache
+from Agents.html_extractor import extract_main_text, StreamingExtractor, LXML_AVAILABLE
+# PDF search results are converted to text when PyMuPDF is installed, otherwise rejected
+from Agents.pdf_text_extractor import extract_pdf_text_pymupdf, PYMUPDF_AVAILABLE
+
+SCRAPER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/118.0"
+}
+SCRAPER_COOKIES = {"CONSENT": "YES+cb.20220419-08-p0.cs+FX+111"}
+
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain"}
+PDF_CONTENT_TYPES = {"application/pdf"}
+
+
+class WebScraper:
+    """
+    Concurrent article scraper on a single pooled, keep-alive httpx client.
+
+    The client lives on a dedicated background event loop so it can be shared by sync callers
+    (threads) and async callers (any event loop) alike. Fetches are bounded by a global
+    concurrency limit and a per-host limit, and a batch is cut off at an overall deadline.
+    When a PageCache is attached, fresh pages are served from it and stale ones are revalidated
+    with conditional GETs. Bodies are streamed with a byte ceiling: non-HTML types are rejected
+    from the headers (PDFs are converted to text), and HTML is decoded and parsed incrementally.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, per_host_limit: Optional[int] = None,
+                 timeout: Optional[float] = None, deadline: Optional[float] = None,
+                 page_cache: Optional[PageCache] = None, max_bytes: Optional[int] = None):
+        self.max_concurrency = max_concurrency or SCRAPER_MAX_CONCURRENCY
+        self.per_host_limit = per_host_limit or SCRAPER_PER_HOST_LIMIT
+        self.timeout = timeout or SCRAPER_TIMEOUT
+        self.deadline = deadline or SCRAPER_DEADLINE
+        self.page_cache = page_cache
+        self.max_bytes = max_bytes or SCRAPER_MAX_BYTES
+        self.recent_fetches = deque(maxlen=200)
+        self._outcomes = Counter()
+        self._bytes_received = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # host -> [semaphore, fetches holding or waiting for it]; dropped when the count reaches zero
+        self._host_slots: Dict[str, list] = {}
+        self._start_lock = threading.Lock()
+
+    # --- Background loop management ---
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="web-scraper", daemon=True)
+                thread.start()
+                self._loop = loop
+                asyncio.run_coroutine_threadsafe(self._init_client(), loop).result()
+            return self._loop
+
+    async def _init_client(self):
+        self._client = httpx.AsyncClient(
+            headers=SCRAPER_HEADERS,
+            cookies=SCRAPER_COOKIES,
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    def close(self):
+        """Close the pooled client and stop the background loop."""
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    async def _shutdown(self):
+        await self._client.aclose()
+        # Let the finalizers of body streams that were stopped early run before the loop stops
+        await self._loop.shutdown_asyncgens()
+
+    # --- Public API ---
+    def fetch_texts(self, urls: List[str], deadline: Optional[float] = None) -> List[Optional[str]]:
+        """
+        Blocking fetch of the main text of every URL.
+
+        Args:
+            urls (list): URLs to scrape.
+            deadline (float, optional): Overall time budget in seconds for the whole batch.
+
+        Returns:
+            list: One entry per input URL, in input order; None for pages that failed or missed the deadline.
+        """
+        if not urls:
+            return []
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._fetch_all(urls, deadline), loop).result()
+
+    async def afetch_texts(self, urls: List[str], deadline: Optional[float] = None) -> List[Optional[str]]:
+        """Async counterpart of fetch_texts, usable from any event loop."""
+        if not urls:
+            return []
+        loop = self._ensure_started()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._fetch_all(urls, deadline), loop))
+
+    # --- Internals (run on the background loop) ---
+    async def _fetch_all(self, urls: List[str], deadline: Optional[float]) -> List[Optional[str]]:
+        tasks = [asyncio.ensure_future(self._fetch_one(url)) for url in urls]
+        done, pending = await asyncio.wait(tasks, timeout=deadline or self.deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logging.warning(f'Scraper deadline reached, dropping {len(pending)} of {len(urls)} pages')
+        return [task.result() if task in done and not task.exception() else None for task in tasks]
+
+    @contextlib.asynccontextmanager
+    async def _host_slot(self, url: str):
+        """Per-host concurrency slot; the host's entry only lives while fetches to it are in flight."""
+        host = urlsplit(url).netloc.lower()
+        entry = self._host_slots.get(host)
+        if entry is None:
+            entry = self._host_slots[host] = [asyncio.Semaphore(self.per_host_limit), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._host_slots[host]
+
+    async def _fetch_one(self, url: str) -> Optional[str]:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            # SQLite lookups run in the executor so they never stall the other fetches on this loop
+            cached = await loop.run_in_executor(None, self.page_cache.get, url) if self.page_cache else None
+            if cached and cached.is_fresh():
+                self._record(url, "cached", None, "", 0, started)
+                return cached.text
+
+            # Host slot first: fetches queued behind a busy host must not sit on global slots
+            async with self._host_slot(url), self._slots:
+                async with self._client.stream("GET", url, headers=cached.validators() if cached else None) as response:
+                    if response.status_code == 304 and cached:
+                        await loop.run_in_executor(None, self.page_cache.refresh, url, response.headers)
+                        self._record(url, "revalidated", 304, "", 0, started)
+                        return cached.text
+                    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                    if response.status_code != 200:
+                        self._record(url, "bad_status", response.status_code, content_type, 0, started)
+                        return None
+
+                    # Gate on the declared type/size before reading any of the body
+                    if content_type in PDF_CONTENT_TYPES and PYMUPDF_AVAILABLE:
+                        declared = int(response.headers.get("content-length") or 0)
+                        if declared > self.max_bytes:
+                            self._record(url, "too_large", 200, content_type, 0, started)
+                            return None
+                        data = await self._read_capped(response)
+                        if data is None:
+                            self._record(url, "too_large", 200, content_type, self.max_bytes, started)
+                            return None
+                        html, text, received = None, None, len(data)
+                    elif content_type in HTML_CONTENT_TYPES or not content_type:
+                        html, text, received, truncated = await self._read_html(response)
+                    else:
+                        self._record(url, "rejected_type", 200, content_type, 0, started)
+                        return None
+
+            if html is None:
+                text = await loop.run_in_executor(None, self._extract_pdf_text, data)
+                if text and self.page_cache:
+                    await loop.run_in_executor(None, self.page_cache.put, url, "", text, response.headers)
+            elif text is None:
+                # No streaming engine available: parse the buffered page off the fetch loop
+                text = await loop.run_in_executor(None, self._extract_and_store, url, html, response.headers)
+            elif self.page_cache:
+                await loop.run_in_executor(None, self.page_cache.put, url, html, text, response.headers)
+
+            outcome = "ok" if text else "empty"
+            if html is not None and truncated and text:
+                outcome = "truncated"
+            self._record(url, outcome, 200, content_type, received, started)
+            return text or None
+        except httpx.HTTPError:
+            # Skip URLs that cause request errors or timeouts
+            self._record(url, "http_error", None, "", 0, started)
+            return None
+        except Exception as e:
+            # Skip URLs that cause parsing errors or other exceptions
+            logging.debug(f'Scraping {url} failed: {e}')
+            self._record(url, "error", None, "", 0, started)
+            return None
+
+    async def _read_html(self, response: httpx.Response):
+        """
+        Stream an HTML body through an incremental decoder (and the streaming extractor when available),
+        stopping at the byte ceiling or as soon as the extractor has enough text.
+
+        Returns:
+            tuple: (html, text or None if not extracted yet, bytes received, truncated)
+        """
+        try:
+            decoder = codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        extractor = StreamingExtractor() if LXML_AVAILABLE and HTML_EXTRACTOR_ENGINE == "lxml" else None
+        parts, received, truncated = [], 0, False
+        # aclosing: stopping early must close the byte stream, not leave it to the garbage collector
+        async with contextlib.aclosing(response.aiter_bytes()) as chunks:
+            async for chunk in chunks:
+                received += len(chunk)
+                if received > self.max_bytes:
+                    chunk = chunk[:len(chunk) - (received - self.max_bytes)]
+                    received, truncated = self.max_bytes, True
+                piece = decoder.decode(chunk)
+                parts.append(piece)
+                if extractor is not None and extractor.feed(piece):
+                    break
+                if truncated:
+                    break
+        parts.append(decoder.decode(b"", final=True))
+        html = "".join(parts)
+        return html, (extractor.close() if extractor is not None else None), received, truncated
+
+    async def _read_capped(self, response: httpx.Response) -> Optional[bytes]:
+        """Read a binary body, giving up (None) as soon as it exceeds the byte ceiling."""
+        data = bytearray()
+        async with contextlib.aclosing(response.aiter_bytes()) as chunks:
+            async for chunk in chunks:
+                data.extend(chunk)
+                if len(data) > self.max_bytes:
+                    return None
+        return bytes(data)
+
+    @staticmethod
+    def _extract_pdf_text(data: bytes) -> Optional[str]:
+        """Plain text of a PDF search result, capped like HTML pages."""
+        text = extract_pdf_text_pymupdf(data, SCRAPER_MAX_TEXT_CHARS, parallel=False)
+        return " ".join(text.split()) or None
+
+    def _record(self, url: str, outcome: str, status: Optional[int], content_type: str, received: int, started: float):
+        """Keep per-URL fetch metrics (recent log + aggregate counters)."""
+        elapsed = round(time.perf_counter() - started, 4)
+        self.recent_fetches.append({
+            "url": url, "outcome": outcome, "status": status, "content_type": content_type,
+            "bytes": received, "seconds": elapsed,
+        })
+        self._outcomes[outcome] += 1
+        self._bytes_received += received
+
+    def stats(self) -> dict:
+        return {
+            "outcomes": dict(self._outcomes),
+            "bytes_received": self._bytes_received,
+            "max_bytes_per_page": self.max_bytes,
+            "recent": list(self.recent_fetches)[-20:],
+        }
+
+    def _extract_and_store(self, url: str, html: str, headers) -> Optional[str]:
+        text = self.extract_main_text(html)
+        if text and self.page_cache:
+            self.page_cache.put(url, html, text, headers)
+        return text or None
+
+    @staticmethod
+    def extract_main_text(html: str) -> str:
+        """
+        Extract the main textual content of an HTML page with the configured extraction engine.
+
+        Args:
+            html (str): Raw HTML.
+
+        Returns:
+            str: Text of the main/article container, or of the whole body when none is found.
+        """
+        return extract_main_text(html)
+
+
+# Shared, process-wide scraper (one connection pool for every agent)
+web_scraper = WebScraper(page_cache=page_cache)
@@ -31,7 +31,7 @@ class ReportAnalysisResponse(BaseModel):
     mime_type: str
 
 class ConversationRequest(BaseModel):
-    # session_id: Optional[str] = Field(None, description="Existing session ID to continue a conversation. If None, a new session starts.")
+    session_id: Optional[str] = Field(None, description="Existing session ID to continue a conversation. If None, a new session starts.")
     query: str = Field(..., description="The user's latest message or question.")
 
 class ConversationResponse(BaseModel):
@@ -50,9 +50,27 @@ class ArticleSummary(BaseModel):
     url: str
     image: Optional[str] = None
     summary: str
+    error: Optional[str] = Field(None, description="Why the article could not be summarized (summary is empty then).")
 
 class SearchResponse(BaseModel):
     message: str
     processing_time_seconds: float
     articles: List[ArticleSummary]
     query: str
+    failed_articles: List[ArticleSummary] = Field(default_factory=list, description="Search results that could not be scraped or summarized.")
+
+class AssessmentJobStage(BaseModel):
+    stage: str
+    at: float
+
+class AssessmentJobResponse(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued, running, succeeded or failed.")
+    stage: Optional[str] = Field(None, description="Last completed pipeline stage.")
+    stages: List[AssessmentJobStage] = Field(default_factory=list)
+    queue_position: Optional[int] = Field(None, description="1-based position in the queue while the job is waiting.")
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[AssessmentResponse] = Field(None, description="The assessment, once the job has succeeded.")
+    error: Optional[str] = None
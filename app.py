@@ -1,5 +1,6 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Body, Depends
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Body, Depends, Header, Query
 from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from Agents.input_agent import InputAgent
 from Agents.diagnosis_agent import DiagnosisAgent
 from Agents.report_generator_agent import ReportGeneratorAgent
@@ -7,27 +8,84 @@ from Agents.search_agent import SearchAgent
 from Agents.chatbot import ChatbotAgent
 from Agents.llms_manager_agent import LLMManager
 from Agents.ReportingAnalysisAgent import ReportingAnalysisAgent
-from config import ALLOWED_IMAGE_EXTENSIONS, ALLOWED_VIDEO_EXTENSIONS
+from Agents.conversation_context import ConversationContext, ConversationStore
+from Agents.llm_response_cache import llm_response_cache
+from Agents.page_cache import page_cache
+from Agents.search_cache import search_result_cache
+from Agents.retrieval_index import retrieval_index
+from Agents.web_scraper import web_scraper
+from Agents.pdf_renderer import pdf_renderer, RENDER_OPTIONS
+from Agents.pdf_cache import pdf_cache, PdfCache
+from Agents.upload_handler import spool_upload, SpooledUpload, UploadSizeLimitMiddleware
+from Agents.report_result_cache import report_result_cache
+from Agents.assessment_jobs import assessment_jobs, QueueFullError
+from Agents.instrumentation import registry, ServerTimingMiddleware, PROMETHEUS_CONTENT_TYPE
+from config import ALLOWED_IMAGE_EXTENSIONS, ALLOWED_VIDEO_EXTENSIONS, METRICS_ENABLED
 import os
 import io
+import json
+import asyncio
 import time
 # import uuid
 import mimetypes
-from typing import Optional, Dict, Any, List
-from PydanticModels import QuestionRequest, QuestionResponse, AssessmentResponse, ReportAnalysisResponse, ConversationRequest, ConversationResponse, PdfRequest, ArticleSummary, SearchResponse
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+from PydanticModels import QuestionRequest, QuestionResponse, AssessmentResponse, ReportAnalysisResponse, ConversationRequest, ConversationResponse, PdfRequest, ArticleSummary, SearchResponse, AssessmentJobResponse
 app = FastAPI(title="DermaAI API",
     description="Simulated dermatology assistant with assessment, report analysis, and conversation capabilities.",
     version="1.1.0",
 )
+# Oversized uploads are rejected while the body streams in, before it is spooled
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/analyze_report", "/assess", "/assess/stream", "/assess/jobs"])
+# Per-request stage breakdown in a Server-Timing header (outermost, so every response is timed)
+if METRICS_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
+
+@app.on_event("startup")
+async def start_pdf_renderer():
+    # Spawn and warm the render workers now, so the first /generate_pdf does not pay for MuPDF's start-up
+    # (never fails: hosts without multiprocessing render in-process instead)
+    await run_in_threadpool(pdf_renderer.start)
+
+
+@app.on_event("shutdown")
+async def stop_pdf_renderer():
+    await run_in_threadpool(pdf_renderer.shutdown)
 
 #Creating Instances of the Agentic Classes
-Diagnosis_Agent = DiagnosisAgent()
-Report_Generator_Agent = ReportGeneratorAgent()
+# All LLMManagers borrow their Gemini client from the shared registry; agents that search reuse Search_Agent
 Search_Agent = SearchAgent()
-Chatbot_Agent = ChatbotAgent()   
+Diagnosis_Agent = DiagnosisAgent(Search_Agent)
+Report_Generator_Agent = ReportGeneratorAgent()
+Chatbot_Agent = ChatbotAgent(Search_Agent)
 Reporting_Analysis_Agent = ReportingAnalysisAgent()
 Input_Agent = InputAgent()
 
+# Chat sessions; each one owns a bounded ConversationContext
+Conversation_Store = ConversationStore()
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """ Format one Server-Sent Event with a JSON payload. """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _iter_chunks(data: bytes, chunk_size: int = 64 * 1024):
+    """ Yield a generated file in fixed-size chunks for a StreamingResponse. """
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """ Whether an If-None-Match header matches our ETag (weak comparison, "*" matches anything). """
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or opaque in candidates
+
+# Headers that keep proxies from buffering an event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 
 # --- API Endpoints ---
 
@@ -41,64 +99,74 @@ async def read_root():
             "/docs": "This API documentation.",
             "/generate_questions": "POST: Generate follow-up questions based on initial statement/symptoms.",
             "/assess": "POST: Perform a full assessment based on initial text or image/audio.",
+            "/assess/stream": "POST: Same as /assess, streaming each pipeline stage's partial result as SSE.",
             "/analyze_report": "POST: Analyze text from an uploaded PDF/DOCX/Image report.",
-            "/continue_conversation": "POST: Continue an existing conversation using a session ID.",
+            "/continue_conversation": "POST: Continue an existing conversation using a session ID (omit it to start a new one).",
+            "/continue_conversation/stream": "POST: Same as /continue_conversation, streaming search status and answer tokens as SSE.",
             "/generate_report_pdf": "POST: Generate a PDF report from assessment results.",
-            "/search_articles": "POST: Search for articles related to a query and return summaries."
+            "/search_articles": "POST: Search for articles related to a query and return summaries.",
+            "/search_articles/stream": "POST: Same as /search_articles, streaming each summary as NDJSON when ready.",
+            "/cache_stats": "GET: Hit/miss counters of the server-side caches and scraper fetch metrics.",
+            "/metrics": "GET: Agent and HTTP latency histograms/counters in Prometheus text format."
             }
         }
     
+def _article_summary(article_metadata: dict, summary: Optional[str], error: Optional[str]) -> ArticleSummary:
+    """ Build the response model for one processed (or failed) search result. """
+    Title = article_metadata.get('title', 'No Title')
+    return ArticleSummary(
+        title=Title,
+        snippet=article_metadata.get('snippet', Title),
+        url=article_metadata.get('url', 'No URL'),
+        image=article_metadata.get('image_context'),
+        summary=str(summary) if error is None else "",
+        error=error,
+    )
+
+async def _search_article_metadata(query: str) -> List[dict]:
+    """ Run the Google search for /search_articles and return the metadata of every result. """
+    print("Performing Google search...")
+    search_results = await run_in_threadpool(Search_Agent.search_articles, query, max_results=10)
+    if not search_results:
+        raise HTTPException(status_code=500, detail="Failed to retrieve search results")
+
+    items_count = len(search_results.get('items', []))
+    print(f"Processing {items_count} search results...")
+    return Search_Agent.articles_url(search_results, max_urls=items_count)
+
 @app.post("/search_articles", response_model=SearchResponse, tags=["Research"])
 async def search_articles_endpoint(query: str = Body(..., embed=True)):
     """
-    Searches for articles related to the query, processes them, and returns summaries.
+    Searches for articles related to the query, processes them concurrently, and returns summaries.
+    Articles that could not be processed are listed in `failed_articles`.
     """
     print(f"\n--- Article Search Request for: {query} ---")
     start_time = time.time()
 
     try:
-        # Search for articles
-        print("Performing Google search...")
-        search_results = Search_Agent.search_articles(query, max_results=10)
-        if not search_results:
-            raise HTTPException(status_code=500, detail="Failed to retrieve search results")
-
-        # Get metadata for all results
-        items_count = len(search_results.get('items', []))
-        print(f"Processing {items_count} search results...")
-        search_metadata = Search_Agent.articles_url(search_results, max_urls=items_count)
-
-        # Process each article
-        articles = []
-        for article_metadata in search_metadata:
-            try:
-                Title = article_metadata.get('title', 'No Title')
-                print(f"Processing article: {Title[:50]}...")
-                
-                summary = Search_Agent.summarize_article(article_metadata, query)
-                
-                articles.append(ArticleSummary(
-                    title=Title,
-                    snippet=article_metadata.get('snippet', Title),
-                    url=article_metadata.get('url', 'No URL'),
-                    image=article_metadata.get('image_context'),
-                    summary=str(summary)
-                ))
-            except Exception as article_error:
-                print(f"⚠️ Error processing article {Title}: {article_error}")
-                continue
+        search_metadata = await _search_article_metadata(query)
+
+        # Scrape + summarize all articles concurrently, then restore the search ranking order
+        results = [None] * len(search_metadata)
+        async for index, article_metadata, summary, error in Search_Agent.summarize_articles(search_metadata, query):
+            if error:
+                print(f"⚠️ Error processing article {article_metadata.get('title', 'No Title')[:50]}: {error}")
+            results[index] = _article_summary(article_metadata, summary, error)
 
+        articles = [article for article in results if article.error is None]
+        failed_articles = [article for article in results if article.error is not None]
         processing_time = round(time.time() - start_time, 2)
         
         if not articles:
             raise HTTPException(status_code=404, detail="No articles could be processed successfully")
 
-        print(f"✅ Successfully processed {len(articles)} articles in {processing_time}s")
+        print(f"✅ Successfully processed {len(articles)} articles ({len(failed_articles)} failed) in {processing_time}s")
         return SearchResponse(
             message="Articles retrieved and processed successfully",
             processing_time_seconds=processing_time,
             query=query,
-            articles=articles
+            articles=articles,
+            failed_articles=failed_articles
         )
 
     except HTTPException as http_exc:
@@ -108,6 +176,41 @@ async def search_articles_endpoint(query: str = Body(..., embed=True)):
         import traceback; traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error processing search request: {str(e)}")
 
+@app.post("/search_articles/stream", tags=["Research"])
+async def search_articles_stream_endpoint(query: str = Body(..., embed=True)):
+    """
+    Streaming variant of /search_articles (NDJSON).
+    Emits one line per article as soon as its summary is ready:
+    `{"type": "article", "index": n, "article": ArticleSummary}`; failed articles carry an `error`.
+    The last line is `{"type": "done", ...}` with totals.
+    """
+    print(f"\n--- Streaming Article Search Request for: {query} ---")
+    start_time = time.time()
+
+    try:
+        search_metadata = await _search_article_metadata(query)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"🚨 Error during article search: {e}")
+        raise HTTPException(status_code=500, detail=f"Error processing search request: {str(e)}")
+
+    async def article_lines():
+        succeeded = failed = 0
+        async for index, article_metadata, summary, error in Search_Agent.summarize_articles(search_metadata, query):
+            article = _article_summary(article_metadata, summary, error)
+            if error:
+                failed += 1
+            else:
+                succeeded += 1
+            yield json.dumps({"type": "article", "index": index, "article": article.model_dump()}) + "\n"
+        processing_time = round(time.time() - start_time, 2)
+        print(f"✅ Streamed {succeeded} articles ({failed} failed) in {processing_time}s")
+        yield json.dumps({"type": "done", "query": query, "succeeded": succeeded, "failed": failed,
+                          "processing_time_seconds": processing_time}) + "\n"
+
+    return StreamingResponse(article_lines(), media_type="application/x-ndjson")
+
 @app.post("/generate_questions", response_model=QuestionResponse, tags=["Assessment Steps"])
 async def get_diagnostic_questions_endpoint(request: QuestionRequest = Body(...)):
     """
@@ -116,12 +219,15 @@ async def get_diagnostic_questions_endpoint(request: QuestionRequest = Body(...)
     print("\n--- Generate Questions Request ---")
     start_time = time.time()
 
+    # History is scoped to this request only
+    context = ConversationContext()
+
     print("Extracting symptoms from statement...")
-    symptoms_to_use = Diagnosis_Agent.extract_symptoms(request.statement)
+    symptoms_to_use = await Diagnosis_Agent.extract_symptoms(request.statement, context)
     if not symptoms_to_use: symptoms_to_use = [] # Ensure list
 
     print(f"Generating questions for statement: \"{request.statement[:100]}...\" with symptoms: {symptoms_to_use}")
-    questions = Diagnosis_Agent.generate_diagnosis_questions( symptoms_to_use, request.statement)
+    questions = await Diagnosis_Agent.generate_diagnosis_questions(symptoms_to_use, request.statement, context)
     processing_time = round(time.time() - start_time, 2)
 
     if questions:
@@ -138,47 +244,75 @@ async def get_diagnostic_questions_endpoint(request: QuestionRequest = Body(...)
         raise HTTPException(status_code=500, detail="Failed to generate diagnostic questions from the LLM.")
 
 
-@app.post("/assess", response_model=AssessmentResponse, tags=["Assessment Steps"])
-async def create_assessment_endpoint(
-    background_tasks: BackgroundTasks,
-    text_input: Optional[str] = Form(None),
-    file_input: Optional[UploadFile] = File(None)
-):
-    """
-    Performs a full simulated assessment based on initial text, image, or audio input.
-    """
-    print("\n--- Full Assessment Request ---")
-    start_time = time.time()
+def _validate_assessment_input(text_input: Optional[str], file_input: Optional[UploadFile]):
     if not text_input and not file_input:
         raise HTTPException(status_code=400, detail="Provide either 'text_input' or 'file_input'.")
     if text_input and file_input:
         raise HTTPException(status_code=400, detail="Provide only one of 'text_input' or 'file_input'.")
 
+
+async def _run_assessment(
+    text_input: Optional[str],
+    upload: Optional[SpooledUpload],
+    progress: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None,
+) -> AssessmentResponse:
+    """
+    The full assessment pipeline shared by /assess and /assess/jobs.
+
+    Args:
+        text_input: The patient's statement (when no file was uploaded).
+        upload: A spooled image upload (when no text was given); closed once it has been described.
+        progress: Optional coroutine called as `progress(stage, partial_payload)` after each stage:
+            input_processed, symptoms_extracted, initial_diagnosis, research_done, final_diagnosis, report_ready.
+
+    Returns:
+        AssessmentResponse: The completed assessment.
+
+    Raises:
+        HTTPException: 4xx for invalid input, 500 when a stage fails.
+    """
+    start_time = time.time()
+
+    async def report(stage: str, payload: Dict[str, Any]):
+        if progress is not None:
+            await progress(stage, payload)
+
     try:
-        initial_statement, visual_description, _, _ = await Input_Agent.process_input(text_input, file_input)
+        initial_statement, visual_description, _, _ = await Input_Agent.process_spooled_input(text_input, upload)
     except HTTPException as e:
         raise e
     except Exception as e:
          raise HTTPException(status_code=500, detail=f"Error processing input: {e}")
+    await report("input_processed", {"initial_statement": initial_statement, "visual_description": visual_description})
 
 
+    # History is scoped to this assessment so concurrent patients never see each other's turns
+    context = ConversationContext()
+
     try:
         print("Extracting symptoms...")
-        symptoms = Diagnosis_Agent.extract_symptoms( initial_statement)
+        symptoms = await Diagnosis_Agent.extract_symptoms(initial_statement, context)
+        await report("symptoms_extracted", {"extracted_symptoms": symptoms})
 
         print("Getting initial diagnosis...")
-        init_diagnosis = Diagnosis_Agent.get_initial_diagnosis()
+        init_diagnosis = await Diagnosis_Agent.get_initial_diagnosis(context)
         if not init_diagnosis: raise HTTPException(status_code=500, detail="Failed to get initial analysis from LLM.")
+        await report("initial_diagnosis", {"initial_diagnosis": init_diagnosis})
 
         print("Performing deep research...")
-        research_texts = Diagnosis_Agent.deep_diagnosis_research(init_diagnosis)
+        research_texts = await Diagnosis_Agent.deep_diagnosis_research(init_diagnosis)
+        await report("research_done", {"research_sources": len(research_texts or [])})
 
         print("Getting final assessment...")
-        final_assessment = Diagnosis_Agent.get_final_diagnosis(research_texts)
+        final_assessment = await Diagnosis_Agent.get_final_diagnosis(
+            research_texts, context, symptoms=symptoms, candidates=Diagnosis_Agent.candidate_diseases(init_diagnosis)
+        )
         if not final_assessment: raise HTTPException(status_code=500, detail="Failed to get final assessment from LLM.")
+        await report("final_diagnosis", {"final_assessment": final_assessment})
 
         print("Generating report markdown...")
-        report_markdown = Report_Generator_Agent.generate_report_markdown(final_assessment)
+        report_markdown = await run_in_threadpool(Report_Generator_Agent.generate_report_markdown, final_assessment, visual_description)
+        await report("report_ready", {"report_markdown": report_markdown})
 
         end_time = time.time()
         processing_time = round(end_time - start_time, 2)
@@ -202,6 +336,133 @@ async def create_assessment_endpoint(
         raise HTTPException(status_code=500, detail=f"Internal server error during assessment: {e}")
 
 
+@app.post("/assess", response_model=AssessmentResponse, tags=["Assessment Steps"])
+async def create_assessment_endpoint(
+    background_tasks: BackgroundTasks,
+    text_input: Optional[str] = Form(None),
+    file_input: Optional[UploadFile] = File(None)
+):
+    """
+    Performs a full simulated assessment based on initial text, image, or audio input.
+    For long-running clients behind proxy timeouts, prefer the /assess/jobs API.
+    """
+    print("\n--- Full Assessment Request ---")
+    _validate_assessment_input(text_input, file_input)
+    upload = await spool_upload(file_input) if file_input else None
+    return await _run_assessment(text_input, upload)
+
+
+@app.post("/assess/stream", tags=["Assessment Steps"])
+async def create_assessment_stream_endpoint(
+    text_input: Optional[str] = Form(None),
+    file_input: Optional[UploadFile] = File(None)
+):
+    """
+    Streaming variant of /assess (Server-Sent Events).
+    One event per pipeline stage as soon as it completes, carrying its partial result:
+    `input_processed`, `symptoms_extracted`, `initial_diagnosis`, `research_done`, `final_diagnosis`,
+    `report_ready` (each with `elapsed_seconds`), then `done` (the full AssessmentResponse) or `error`.
+    """
+    print("\n--- Streaming Assessment Request ---")
+    start_time = time.time()
+    _validate_assessment_input(text_input, file_input)
+    upload = await spool_upload(file_input) if file_input else None
+    if upload is not None:
+        # The request's upload may be closed before the stream has read it
+        await upload.detach()
+
+    async def assessment_events():
+        stages: asyncio.Queue = asyncio.Queue()
+
+        async def progress(stage: str, payload: Dict[str, Any]):
+            await stages.put((stage, payload))
+
+        task = asyncio.create_task(_run_assessment(text_input, upload, progress))
+        next_stage = None
+        try:
+            while True:
+                next_stage = asyncio.ensure_future(stages.get())
+                await asyncio.wait({next_stage, task}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_stage.done():
+                    next_stage.cancel()
+                    break
+                stage, payload = next_stage.result()
+                yield _sse_event(stage, {**payload, "elapsed_seconds": round(time.time() - start_time, 2)})
+            while not stages.empty():
+                stage, payload = stages.get_nowait()
+                yield _sse_event(stage, {**payload, "elapsed_seconds": round(time.time() - start_time, 2)})
+            try:
+                result = task.result()
+                yield _sse_event("done", result.model_dump())
+            except HTTPException as e:
+                yield _sse_event("error", {"status_code": e.status_code, "detail": e.detail,
+                                           "processing_time_seconds": round(time.time() - start_time, 2)})
+            except Exception as e:
+                yield _sse_event("error", {"status_code": 500, "detail": f"Internal server error during assessment: {e}",
+                                           "processing_time_seconds": round(time.time() - start_time, 2)})
+        finally:
+            # Client went away (or the stream ended): stop the pipeline and release the upload
+            if next_stage is not None and not next_stage.done():
+                next_stage.cancel()
+            if not task.done():
+                task.cancel()
+            if upload is not None:
+                await upload.close()
+
+    return StreamingResponse(assessment_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/assess/jobs", response_model=AssessmentJobResponse, status_code=202, tags=["Assessment Steps"])
+async def submit_assessment_job_endpoint(
+    response: Response,
+    text_input: Optional[str] = Form(None),
+    file_input: Optional[UploadFile] = File(None)
+):
+    """
+    Queues a full assessment and returns its job at once (202); poll GET /assess/jobs/{job_id}
+    for per-stage progress and the final AssessmentResponse. 503 when the queue is full.
+    """
+    print("\n--- Assessment Job Submitted ---")
+    _validate_assessment_input(text_input, file_input)
+    upload = await spool_upload(file_input) if file_input else None
+    if upload is not None:
+        # The request's upload is closed once this response is sent; the job needs its own copy
+        await upload.detach()
+
+    try:
+        job = assessment_jobs.submit(
+            lambda progress: _run_assessment(text_input, upload, progress),
+            on_discard=upload.close if upload is not None else None,
+        )
+    except QueueFullError as e:
+        if upload is not None:
+            await upload.close()
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    response.headers["Location"] = f"/assess/jobs/{job.job_id}"
+    return job.to_dict(assessment_jobs.queue_position(job))
+
+
+@app.get("/assess/jobs", tags=["Assessment Steps"])
+async def assessment_jobs_stats_endpoint():
+    """ Queued/running job counts and totals of the assessment worker pool. """
+    return assessment_jobs.stats()
+
+
+@app.get("/assess/jobs/{job_id}", response_model=AssessmentJobResponse, tags=["Assessment Steps"])
+async def assessment_job_status_endpoint(job_id: str, wait: float = Query(0, ge=0, le=30, description="Long-poll: seconds to wait for the next state change.")):
+    """
+    Status of an assessment job: queued (with its queue position), running (with the stages
+    completed so far), succeeded (with `result`) or failed (with `error`).
+    """
+    job = assessment_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id.")
+    if wait:
+        await job.wait_for_change(wait)
+    return job.to_dict(assessment_jobs.queue_position(job))
+
+
 @app.post("/analyze_report", response_model=ReportAnalysisResponse, tags=["Utilities"])
 async def analyze_report_endpoint(report_file: UploadFile = File(...)):
     """
@@ -211,24 +472,19 @@ async def analyze_report_endpoint(report_file: UploadFile = File(...)):
     print("\n--- Analyze Report Request ---")
     start_time = time.time()
 
-    max_size = 20 * 1024 * 1024
-    size = await report_file.read()
-    await report_file.seek(0)
-    if len(size) > max_size:
-        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_size // 1024 // 1024}MB.")
-
-    file_bytes = await report_file.read()
-    filename = report_file.filename
-    mime_type = report_file.content_type
-    if not mime_type or mime_type == 'application/octet-stream':
-        mime_type, _ = mimetypes.guess_type(filename)
-    await report_file.close()
-
+    # Size limit, SHA-256 and MIME type of the spooled upload; the content stays in the spooled temp file
+    upload = await spool_upload(report_file)
+    filename = upload.filename
+    mime_type = upload.mime_type
     if not mime_type:
+         await upload.close()
          raise HTTPException(status_code=415, detail="Could not determine file MIME type.")
-    print(f"Analyzing file: {filename}, Type: {mime_type}")
+    print(f"Analyzing file: {filename}, Type: {mime_type}, {upload.size} bytes")
 
-    analysis_result = Reporting_Analysis_Agent.analyze_report_file(file_bytes, mime_type)
+    try:
+        analysis_result = await Reporting_Analysis_Agent.analyze_report_file(upload.buffer(), mime_type, upload.sha256)
+    finally:
+        await upload.close()
     processing_time = round(time.time() - start_time, 2)
 
     if analysis_result.startswith("Error:"):
@@ -246,9 +502,10 @@ async def analyze_report_endpoint(report_file: UploadFile = File(...)):
         )
 
 @app.post("/generate_report_pdf", tags=["Reporting"])
-async def create_report_pdf_endpoint(request: PdfRequest = Body(...)):
+async def create_report_pdf_endpoint(request: PdfRequest = Body(...), if_none_match: Optional[str] = Header(None)):
     """
     Generates a downloadable PDF report from assessment results.
+    Responses carry a weak ETag derived from the report content; send it back in If-None-Match to get a 304.
     """
     print("\n--- PDF Generation Request ---")
     start_time = time.time()
@@ -257,21 +514,39 @@ async def create_report_pdf_endpoint(request: PdfRequest = Body(...)):
     try:
         if not report_markdown:
             print("Generating markdown for PDF...")
-            report_markdown = Report_Generator_Agent.generate_report_markdown(request.final_assessment, request.visual_description)
+            report_markdown = await run_in_threadpool(Report_Generator_Agent.generate_report_markdown, request.final_assessment, request.visual_description)
             if report_markdown.startswith("Error:"):
                 raise HTTPException(status_code=500, detail=f"Failed to generate report content: {report_markdown}")
 
-        print("Generating PDF from markdown...")
-        pdf_bytes = Report_Generator_Agent.markdown_to_pdf(report_markdown)
+        pdf_key = PdfCache.make_key(report_markdown, RENDER_OPTIONS)
+        # Weak: a re-render (e.g. after cache eviction) carries new creation dates, so the bytes are not stable
+        etag = f'W/"{pdf_key}"'
+        if _etag_matches(if_none_match, etag):
+            print("Client copy is current, answering 304.")
+            if pdf_cache:
+                pdf_cache.record_not_modified()
+            return Response(status_code=304, headers={"ETag": etag})
+
+        pdf_bytes = await run_in_threadpool(pdf_cache.get, pdf_key) if pdf_cache else None
+        if pdf_bytes is None:
+            print("Generating PDF from markdown...")
+            pdf_bytes = await pdf_renderer.render(report_markdown)
+            if pdf_bytes and pdf_cache:
+                await run_in_threadpool(pdf_cache.set, pdf_key, pdf_bytes)
         processing_time = round(time.time() - start_time, 2)
 
         if pdf_bytes:
-            print(f"✅ PDF generated successfully in {processing_time}s.")
+            print(f"✅ PDF ready in {processing_time}s.")
             filename = f"Simulated_Dermatology_Report_{time.strftime('%Y%m%d_%H%M%S')}.pdf"
             return StreamingResponse(
-                io.BytesIO(pdf_bytes),
+                _iter_chunks(pdf_bytes),
                 media_type="application/pdf",
-                headers={"Content-Disposition": f"attachment; filename={filename}"}
+                headers={
+                    "Content-Disposition": f"attachment; filename={filename}",
+                    "Content-Length": str(len(pdf_bytes)),
+                    "ETag": etag,
+                    "Cache-Control": "private, no-cache",
+                }
             )
         else:
             print(f"❌ PDF generation failed in {processing_time}s (likely WeasyPrint issue).")
@@ -289,27 +564,19 @@ async def create_report_pdf_endpoint(request: PdfRequest = Body(...)):
 async def continue_conversation_endpoint(request: ConversationRequest = Body(...)):
     """
     Continues an existing conversation or starts a new one.
-    Uses simple in-memory storage (NOT FOR PRODUCTION).
+    Sessions are kept in memory with a bounded, summarized history per session.
     """
     print("\n--- Continue Conversation Request ---")
     start_time = time.time()
-    # session_id = request.session_id
     user_query = request.query
 
-    # if session_id and session_id in conversation_histories:
-    #     print(f"Continuing session: {session_id}")
-    #     chat_session = conversation_histories[session_id]
-    #     if not isinstance(chat_session, ChatSession):
-    #          print(f"⚠️ Invalid object found in history for session {session_id}. Starting new session.")
-    #          session_id = str(uuid.uuid4())
-    #          chat_session = model.start_chat(history=[])
-    # else:
-    #     session_id = str(uuid.uuid4()) # Generate new ID
-    #     print(f"Starting new session: {session_id}")
-    #     chat_session = model.start_chat(history=[]) # Initialize a new ChatSession
-
-    # --- Call the new function from Agents/chatbot.py ---
-    llm_response = Chatbot_Agent.generate_chat_response(user_query)
+    context = Conversation_Store.get_or_create(request.session_id)
+    if request.session_id == context.session_id:
+        print(f"Continuing session: {context.session_id}")
+    else:
+        print(f"Starting new session: {context.session_id}")
+
+    llm_response = await Chatbot_Agent.generate_chat_response(user_query, context)
 
     
     processing_time = round(time.time() - start_time, 2)
@@ -318,20 +585,62 @@ async def continue_conversation_endpoint(request: ConversationRequest = Body(...
         print(f"❌ LLM error during conversation in {processing_time}s: {llm_response}")
         # Return error response but include session_id
         return ConversationResponse(
-            # session_id=session_id,
+            session_id=context.session_id,
             response=llm_response,
             processing_time_seconds=processing_time
         )
     else:
         print(f"✅ Conversation response generated successfully in {processing_time}s.")
         return ConversationResponse(
-            # session_id=session_id,
+            session_id=context.session_id,
             response=llm_response,
             processing_time_seconds=processing_time
         )
 
 
 
+@app.get("/cache_stats", tags=["Utilities"])
+async def cache_stats_endpoint():
+    """ Hit/miss counters of the server-side caches, plus per-URL scraper fetch metrics. """
+    return {
+        "llm_responses": llm_response_cache.stats() if llm_response_cache else None,
+        "scraped_pages": page_cache.stats() if page_cache else None,
+        "custom_search": search_result_cache.stats(),
+        "pdf_reports": pdf_cache.stats() if pdf_cache else None,
+        "report_analysis": report_result_cache.stats() if report_result_cache else None,
+        "retrieval_index": retrieval_index.stats() if retrieval_index else None,
+        "scraper": web_scraper.stats(),
+    }
+
+
+@app.get("/metrics", tags=["Utilities"])
+async def metrics_endpoint():
+    """ Latency histograms and call counters of the agents and HTTP routes, in Prometheus text format. """
+    return Response(content=registry.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.post("/continue_conversation/stream", tags=["Conversation"])
+async def continue_conversation_stream_endpoint(request: ConversationRequest = Body(...)):
+    """
+    Streaming variant of /continue_conversation (Server-Sent Events).
+    Events: `session` (session_id), `status` (searching / generating), `token` (answer chunks),
+    then `done` (full response and timing) or `error`.
+    """
+    print("\n--- Streaming Conversation Request ---")
+    start_time = time.time()
+    context = Conversation_Store.get_or_create(request.session_id)
+
+    async def chat_events():
+        yield _sse_event("session", {"session_id": context.session_id})
+        async for event, data in Chatbot_Agent.stream_chat_response(request.query, context):
+            if event in ("done", "error"):
+                data["processing_time_seconds"] = round(time.time() - start_time, 2)
+            yield _sse_event(event, data)
+
+    return StreamingResponse(chat_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+
 # --- Run Instruction (for local development) ---
 if __name__ == "__main__":
     import uvicorn
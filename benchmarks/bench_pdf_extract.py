@@ -0,0 +1,94 @@
+"""
+Benchmark: PDF text extraction engines on synthetic multi-hundred-page lab reports.
+
+Compares the original PyPDF2 loop (every page, then truncated to the budget) with the PyMuPDF
+engine, sequential and process-parallel, with and without the character budget.
+--image-kb embeds an incompressible image in every page, to size documents like scanned reports.
+
+Usage:
+    python -m benchmarks.bench_pdf_extract [--pages 300 600] [--max-chars 25001] [--repeat 3] [--image-kb 100]
+"""
+import io
+import os
+import time
+import argparse
+from PIL import Image
+from Agents.pdf_text_extractor import (extract_pdf_text_pymupdf, extract_pdf_text_pypdf2, PYMUPDF_AVAILABLE,
+                                       PYPDF2_AVAILABLE, _worker_count, fitz)
+
+ROWS = [
+    ("Haemoglobin", "13.8", "g/dL", "13.0 - 17.0"),
+    ("White cell count", "11.2", "x10^9/L", "4.0 - 11.0"),
+    ("Platelets", "245", "x10^9/L", "150 - 400"),
+    ("C-reactive protein", "18", "mg/L", "< 5"),
+    ("Immunoglobulin E", "412", "kU/L", "< 100"),
+    ("Eosinophils", "0.9", "x10^9/L", "0.0 - 0.5"),
+]
+
+
+def make_lab_report(pages: int, image_kb: int = 0) -> bytes:
+    doc = fitz.open()
+    side = int((image_kb * 1024 / 3) ** 0.5)
+    for number in range(pages):
+        page = doc.new_page()
+        lines = [f"DermaLab Pathology Services - Cumulative Report - Page {number + 1} of {pages}", ""]
+        for visit in range(6):
+            lines.append(f"Collected 2024-{1 + (number + visit) % 12:02d}-{1 + visit * 4:02d}  Specimen: serum")
+            lines += [f"  {name:<20}{value:>8} {unit:<10} ref {ref}" for name, value, unit, ref in ROWS]
+            lines.append("  Comment: raised IgE and eosinophils are consistent with an atopic process.")
+        page.insert_text((40, 50), "\n".join(lines), fontsize=8)
+        if side:
+            image = io.BytesIO()
+            Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(image, "PNG")
+            page.insert_image(fitz.Rect(400, 700, 560, 820), stream=image.getvalue())
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data
+
+
+def original_pypdf2(data: bytes, max_chars: int) -> str:
+    text = extract_pdf_text_pypdf2(data)
+    return text[:max_chars]
+
+
+def timed(extract, data: bytes, repeat: int):
+    best, text = float("inf"), ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extract(data)
+        best = min(best, time.perf_counter() - start)
+    return best, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[300, 600])
+    parser.add_argument("--max-chars", type=int, default=25001)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--image-kb", type=int, default=0, help="incompressible image per page (KB)")
+    args = parser.parse_args()
+    if not PYMUPDF_AVAILABLE:
+        raise SystemExit("PyMuPDF is required to build the benchmark documents.")
+
+    strategies = [
+        ("pymupdf, full", lambda d: extract_pdf_text_pymupdf(d, None, parallel=False)),
+        ("pymupdf, parallel, full", lambda d: extract_pdf_text_pymupdf(d, None, parallel=True)),
+        ("pymupdf, budget", lambda d: extract_pdf_text_pymupdf(d, args.max_chars, parallel=False)),
+        ("pymupdf, parallel, budget", lambda d: extract_pdf_text_pymupdf(d, args.max_chars, parallel=True)),
+    ]
+    if PYPDF2_AVAILABLE:
+        strategies.insert(0, ("pypdf2 (original)", lambda d: original_pypdf2(d, args.max_chars)))
+
+    print(f"{_worker_count()} worker processes, budget {args.max_chars} chars, best of {args.repeat}\n")
+    for pages in args.pages:
+        data = make_lab_report(pages, args.image_kb)
+        print(f"{pages} pages ({len(data) / 1e6:.2f} MB)")
+        print(f"  {'strategy':<28}{'seconds':>10}{'chars':>10}")
+        for name, extract in strategies:
+            seconds, text = timed(extract, data, args.repeat)
+            print(f"  {name:<28}{seconds:>10.3f}{len(text):>10}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
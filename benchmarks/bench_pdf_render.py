@@ -0,0 +1,83 @@
+"""
+Benchmark: throughput of N concurrent report PDF renders.
+
+Compares rendering on the event loop (the original behaviour), in the default thread pool,
+and in the PdfRenderer process pool. Besides throughput it reports the longest event-loop
+stall seen by a 10 ms ticker, i.e. how long other requests would have been frozen.
+
+Usage:
+    python -m benchmarks.bench_pdf_render [--renders 16] [--workers 0] [--sections 12]
+"""
+import time
+import asyncio
+import argparse
+from Agents.pdf_renderer import PdfRenderer, render_markdown_pdf
+
+
+def make_report(sections: int) -> str:
+    report = "# Dermatological Diagnosis Report\n\n---\n\n## Final Diagnosis: **Psoriasis**\n\n---\n\n"
+    for i in range(sections):
+        report += f"### Differential {i + 1}\n\n#### Justification & Causes:\n"
+        report += "Well-demarcated erythematous plaques with silvery scale on extensor surfaces. " * 12 + "\n\n"
+        report += "| Feature | Finding |\n|---|---|\n| Distribution | Symmetric |\n| Itch | Mild |\n\n"
+    report += "## Treatment & Recommendations\n\n---\n\nTopical corticosteroids and vitamin D analogues.\n"
+    return report
+
+
+async def on_loop(report: str, renders: int):
+    for _ in range(renders):
+        render_markdown_pdf(report)
+
+
+async def in_threads(report: str, renders: int):
+    await asyncio.gather(*(asyncio.to_thread(render_markdown_pdf, report) for _ in range(renders)))
+
+
+async def in_processes(renderer: PdfRenderer, report: str, renders: int):
+    await asyncio.gather(*(renderer.render(report) for _ in range(renders)))
+
+
+async def max_loop_stall(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def main_async(args):
+    report = make_report(args.sections)
+    size = len(render_markdown_pdf(report))
+    renderer = PdfRenderer(max_workers=args.workers or None)
+    renderer.start()
+    print(f"{args.renders} concurrent renders, report {len(report)} chars -> {size / 1024:.0f} KB PDF, "
+          f"{renderer.max_workers} worker processes\n")
+    print(f"{'strategy':<16}{'seconds':>10}{'renders/s':>12}{'max stall ms':>14}")
+    for name, run in (
+        ("event loop", lambda: on_loop(report, args.renders)),
+        ("thread pool", lambda: in_threads(report, args.renders)),
+        ("process pool", lambda: in_processes(renderer, report, args.renders)),
+    ):
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(max_loop_stall(stop))
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        await run()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        stall = await ticker
+        print(f"{name:<16}{elapsed:>10.2f}{args.renders / elapsed:>12.1f}{stall * 1000:>14.0f}")
+    renderer.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = one per core)")
+    parser.add_argument("--sections", type=int, default=12)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
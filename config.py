@@ -28,3 +28,111 @@ timeout = int(os.getenv('DERMAAI_TIMEOUT', '30'))
 LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-2.0-flash-001')
 LLM_TEMPERATURE = float(os.getenv('LLM_TEMPERATURE', '0'))
 LLM_MAX_TOKENS = os.getenv('LLM_MAX_TOKENS')
+
+# Conversation context settings (per request / per chat session)
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '8000'))
+CONTEXT_KEEP_RECENT_TURNS = int(os.getenv('CONTEXT_KEEP_RECENT_TURNS', '4'))
+CONVERSATION_SESSION_TTL = int(os.getenv('CONVERSATION_SESSION_TTL', '3600'))
+CONVERSATION_MAX_SESSIONS = int(os.getenv('CONVERSATION_MAX_SESSIONS', '1000'))
+
+# Maximum number of concurrent LLM calls across the whole process
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '32'))
+
+# LLM response cache (memory LRU + optional SQLite tier; empty path disables the disk tier)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '512'))
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', '86400'))
+LLM_CACHE_DB_PATH = os.getenv('LLM_CACHE_DB_PATH', 'cache/llm_responses.sqlite3')
+LLM_CACHE_DISK_MAX_ENTRIES = int(os.getenv('LLM_CACHE_DISK_MAX_ENTRIES', '20000'))
+
+# Article scraper settings (shared pooled HTTP client)
+SCRAPER_MAX_CONCURRENCY = int(os.getenv('SCRAPER_MAX_CONCURRENCY', '16'))
+SCRAPER_PER_HOST_LIMIT = int(os.getenv('SCRAPER_PER_HOST_LIMIT', '4'))
+SCRAPER_TIMEOUT = float(os.getenv('SCRAPER_TIMEOUT', '10'))
+SCRAPER_DEADLINE = float(os.getenv('SCRAPER_DEADLINE', '20'))
+
+# Scraped page cache (compressed HTML + extracted text, LRU-evicted by total size)
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PAGE_CACHE_DB_PATH = os.getenv('PAGE_CACHE_DB_PATH', 'cache/pages.sqlite3')
+PAGE_CACHE_MAX_BYTES = int(os.getenv('PAGE_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+PAGE_CACHE_DEFAULT_TTL = int(os.getenv('PAGE_CACHE_DEFAULT_TTL', str(7 * 24 * 3600)))
+
+# Google Custom Search response cache
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', str(6 * 3600)))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '2048'))
+
+# Number of articles scraped and summarized at once by /search_articles
+SEARCH_SUMMARY_CONCURRENCY = int(os.getenv('SEARCH_SUMMARY_CONCURRENCY', '5'))
+
+# Evidence selection for the final diagnosis prompt
+EVIDENCE_TOKEN_BUDGET = int(os.getenv('EVIDENCE_TOKEN_BUDGET', '6000'))
+EVIDENCE_CHUNK_TOKENS = int(os.getenv('EVIDENCE_CHUNK_TOKENS', '200'))
+
+# Local retrieval index over scraped pages (used by the chatbot before falling back to live search)
+RETRIEVAL_INDEX_ENABLED = os.getenv('RETRIEVAL_INDEX_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RETRIEVAL_INDEX_DB_PATH = os.getenv('RETRIEVAL_INDEX_DB_PATH', 'cache/retrieval_index.sqlite3')
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '5'))
+RETRIEVAL_MIN_HITS = int(os.getenv('RETRIEVAL_MIN_HITS', '2'))
+RETRIEVAL_MIN_COVERAGE = float(os.getenv('RETRIEVAL_MIN_COVERAGE', '0.6'))
+# Index size caps; the pages indexed (or seen again) least recently are evicted first
+RETRIEVAL_INDEX_MAX_DOCUMENTS = int(os.getenv('RETRIEVAL_INDEX_MAX_DOCUMENTS', '5000'))
+RETRIEVAL_INDEX_MAX_BYTES = int(os.getenv('RETRIEVAL_INDEX_MAX_BYTES', str(200 * 1024 * 1024)))
+
+# HTML main-content extraction ("lxml" streaming engine, or "bs4" for the BeautifulSoup html.parser)
+HTML_EXTRACTOR_ENGINE = os.getenv('HTML_EXTRACTOR_ENGINE', 'lxml')
+SCRAPER_MAX_TEXT_CHARS = int(os.getenv('SCRAPER_MAX_TEXT_CHARS', '20000'))
+# Byte ceiling per downloaded page (HTML is truncated there, PDFs above it are skipped)
+SCRAPER_MAX_BYTES = int(os.getenv('SCRAPER_MAX_BYTES', str(2 * 1024 * 1024)))
+
+# Report image lookups (disease name -> image URLs), fetched concurrently per report
+REPORT_IMAGE_LOOKUP_WORKERS = int(os.getenv('REPORT_IMAGE_LOOKUP_WORKERS', '8'))
+
+# PDF report rendering processes (0 = one per CPU core)
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', '0'))
+
+# Rendered report PDFs (memory LRU + SQLite, both bounded by total size)
+PDF_CACHE_ENABLED = os.getenv('PDF_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PDF_CACHE_MEMORY_MAX_BYTES = int(os.getenv('PDF_CACHE_MEMORY_MAX_BYTES', str(64 * 1024 * 1024)))
+PDF_CACHE_DB_PATH = os.getenv('PDF_CACHE_DB_PATH', 'cache/pdf_reports.sqlite3')
+PDF_CACHE_DISK_MAX_BYTES = int(os.getenv('PDF_CACHE_DISK_MAX_BYTES', str(500 * 1024 * 1024)))
+
+# PDF text extraction ("pymupdf", or "pypdf2" for the pure-Python reader)
+PDF_EXTRACTOR_ENGINE = os.getenv('PDF_EXTRACTOR_ENGINE', 'pymupdf')
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', '0'))  # 0 = one per CPU core
+# Sequential extraction costs ~1.2-1.9 ms/page; fanning out to the pool adds a fixed ~0.04-0.10 s (temp file
+# write, one document open per worker), so 4 workers only break even somewhere around 45-110 pages
+# (see benchmarks/bench_pdf_extract.py --image-kb)
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '96'))
+PDF_PAGES_PER_BATCH = int(os.getenv('PDF_PAGES_PER_BATCH', '16'))
+
+# OCR of image reports (preprocessing + Tesseract in a process pool)
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', '0'))  # 0 = one per CPU core
+OCR_DOCUMENT_TIMEOUT = float(os.getenv('OCR_DOCUMENT_TIMEOUT', '60'))
+OCR_TILE_HEIGHT = int(os.getenv('OCR_TILE_HEIGHT', '2400'))
+OCR_MAX_PAGES = int(os.getenv('OCR_MAX_PAGES', '30'))
+OCR_MAX_SKEW_DEGREES = float(os.getenv('OCR_MAX_SKEW_DEGREES', '5'))
+
+# Long medical reports: map-reduce analysis (sections analyzed concurrently, then merged)
+REPORT_SECTION_TOKENS = int(os.getenv('REPORT_SECTION_TOKENS', '3000'))
+REPORT_MAP_CONCURRENCY = int(os.getenv('REPORT_MAP_CONCURRENCY', '4'))
+REPORT_MAX_TEXT_CHARS = int(os.getenv('REPORT_MAX_TEXT_CHARS', '300000'))
+
+# Uploads (/analyze_report, /assess): size limit enforced while the body streams in
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv('UPLOAD_CHUNK_BYTES', str(1024 * 1024)))
+
+# /analyze_report results keyed by file SHA-256 (extracted text and final analysis evicted separately)
+REPORT_CACHE_ENABLED = os.getenv('REPORT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+REPORT_CACHE_DB_PATH = os.getenv('REPORT_CACHE_DB_PATH', 'cache/report_results.sqlite3')
+REPORT_TEXT_CACHE_MAX_BYTES = int(os.getenv('REPORT_TEXT_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))
+REPORT_ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('REPORT_ANALYSIS_CACHE_MAX_ENTRIES', '5000'))
+REPORT_ANALYSIS_CACHE_TTL = int(os.getenv('REPORT_ANALYSIS_CACHE_TTL', str(7 * 24 * 3600)))
+
+# /assess/jobs: assessments run by a bounded worker pool, clients poll for progress
+ASSESS_JOB_WORKERS = int(os.getenv('ASSESS_JOB_WORKERS', '4'))
+ASSESS_JOB_QUEUE_DEPTH = int(os.getenv('ASSESS_JOB_QUEUE_DEPTH', '50'))
+ASSESS_JOB_TTL = int(os.getenv('ASSESS_JOB_TTL', '3600'))  # how long finished jobs stay pollable
+ASSESS_JOB_MAX_RETAINED = int(os.getenv('ASSESS_JOB_MAX_RETAINED', '1000'))
+
+# Instrumentation: agent latency histograms, Server-Timing headers and Prometheus /metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,84 @@
+import asyncio
+from typing import Any, AsyncIterator, List, Optional
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import Agents.llms_manager_agent as llms_manager_agent
+from Agents.llm_client_registry import LLMClientRegistry
+from Agents.conversation_context import ConversationContext
+
+
+class StreamingModel(BaseChatModel):
+    """Chat model streaming `tokens` chunks (forever when None), recording whether its stream was closed."""
+
+    tokens: Optional[int] = None
+    closed: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming-test"
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="tok " * (self.tokens or 1)))])
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        try:
+            sent = 0
+            while self.tokens is None or sent < self.tokens:
+                await asyncio.sleep(0.001)
+                sent += 1
+                yield ChatGenerationChunk(message=AIMessageChunk(content="tok "))
+        finally:
+            self.closed = True
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = LLMClientRegistry(max_concurrency=1)
+    monkeypatch.setattr(llms_manager_agent, "llm_client_registry", registry)
+    return registry
+
+
+def make_manager(registry: LLMClientRegistry, model: StreamingModel) -> llms_manager_agent.LLMManager:
+    registry.get_client = lambda **kwargs: model
+    return llms_manager_agent.LLMManager()
+
+
+async def wait_until(predicate, timeout: float = 2.0):
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.001)
+
+
+def test_stalled_client_does_not_hold_llm_slot(registry):
+    model = StreamingModel(tokens=50)
+    manager = make_manager(registry, model)
+
+    async def scenario():
+        stream = manager.astream_message_to_llm("hello", ConversationContext())
+        first = await stream.__anext__()
+        # The client stops reading: the model is still drained and the only slot is given back
+        await wait_until(lambda: model.closed and registry.in_flight == 0)
+        async with asyncio.timeout(1):
+            async with registry.async_slot():
+                pass
+        return first + "".join([chunk async for chunk in stream])
+
+    assert asyncio.run(scenario()) == "tok " * 50
+
+
+def test_disconnect_stops_the_model_stream(registry):
+    model = StreamingModel(tokens=None)
+    manager = make_manager(registry, model)
+    context = ConversationContext()
+
+    async def scenario():
+        stream = manager.astream_message_to_llm("hello", context)
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(scenario())
+    assert model.closed
+    assert registry.in_flight == 0
+    assert not context.turns
@@ -0,0 +1,37 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import Agents.pdf_renderer as pdf_renderer_module
+from Agents.pdf_renderer import PdfRenderer
+
+
+def no_multiprocessing(*args, **kwargs):
+    # What ProcessPoolExecutor raises on hosts without a working sem_open (e.g. AWS Lambda / Vercel)
+    raise NotImplementedError("This platform lacks a functioning sem_open implementation")
+
+
+class UnspawnablePool(ProcessPoolExecutor):
+    def submit(self, *args, **kwargs):
+        raise OSError(38, "Function not implemented")
+
+
+def test_pool_creation_failure_falls_back_to_in_process(monkeypatch):
+    monkeypatch.setattr(pdf_renderer_module, "ProcessPoolExecutor", no_multiprocessing)
+    renderer = PdfRenderer(max_workers=2)
+    renderer.start()
+    pdf_bytes = asyncio.run(renderer.render("# Report\n\nbody"))
+    assert pdf_bytes.startswith(b"%PDF")
+    assert renderer.stats()["in_process"]
+    assert renderer.stats()["renders"] == 1
+
+
+def test_worker_spawn_failure_falls_back_to_in_process(monkeypatch):
+    monkeypatch.setattr(pdf_renderer_module, "ProcessPoolExecutor", UnspawnablePool)
+    renderer = PdfRenderer(max_workers=1)
+    renderer.start()
+    assert renderer.stats()["in_process"]
+
+    renderer = PdfRenderer(max_workers=1)
+    pdf_bytes = asyncio.run(renderer.render("# Report\n\nbody"))
+    assert pdf_bytes.startswith(b"%PDF")
+    assert renderer.stats()["in_process"]
+    renderer.shutdown()